@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from bench.synthetic import SyntheticDataset
+from cmd.loading_list_ex_2 import build_station_object, discover_target_sheets
+from cmd.smw_demand import apply_pending_consumption
+from run_utils import MaterialGroupAndDeliversHandler, summary_delivery
+from util.bom_template import scale_template, template_from_groups
+from util.demand_netting import DemandMatrix
+from util.model_ingest import build
+from util.smw_stock import SWHInventoryItem, iter_swh_inventory_batches, parse_swh_inventory
+from util.wo_details import build_material_groups_from_details
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+DEFAULT_SCALES = (1, 10, 100)
+REGRESSION_THRESHOLD = 1.2
+
+
+class Case(NamedTuple):
+    name: str
+    setup: Callable[[SyntheticDataset, Dict[str, Any]], Any]  # untimed, returns the input of run
+    run: Callable[[Any], Any]
+
+
+def _groups_by_wo(ds: SyntheticDataset, shared: Dict[str, Any]):
+    if "groups" not in shared:
+        shared["groups"] = {wo: build_material_groups_from_details(rows) for wo, rows in ds.details.items()}
+    return shared["groups"]
+
+
+def _summaries_by_wo(ds: SyntheticDataset, shared: Dict[str, Any]):
+    if "summaries" not in shared:
+        shared["summaries"] = {wo: summary_delivery(records) for wo, records in ds.consumption.items()}
+    return shared["summaries"]
+
+
+def _templates(ds, shared):
+    templates: Dict[str, Any] = {"mo_status": ds.mo_status}
+    groups = _groups_by_wo(ds, shared)
+    for status in ds.mo_status:
+        if status.sku not in templates:
+            templates[status.sku] = template_from_groups(status.sku, status.ver, status.mo, groups[status.mo])
+    return templates
+
+
+def _handlers(ds, shared):
+    groups, summaries = _groups_by_wo(ds, shared), _summaries_by_wo(ds, shared)
+    handlers = []
+    for wo, wo_groups in groups.items():
+        handler = MaterialGroupAndDeliversHandler(groups=copy.deepcopy(wo_groups))
+        handler.add_deliver_materials(summaries[wo])
+        handlers.append(handler)
+    return handlers
+
+
+def _pending(ds, shared):
+    wo_list = copy.deepcopy(_groups_by_wo(ds, shared))
+    for status in ds.mo_status:
+        for group in wo_list[status.mo]:
+            group.pending_consumption = group.consumption_qty * (status.target_qty - status.output_qty)
+    inventory: Dict[str, float] = {}
+    for row in ds.swh_inventory_rows():
+        inventory[row["PN"]] = inventory.get(row["PN"], 0) + row["QTY"]
+    return inventory, wo_list
+
+
+def _loading_list(ds, shared):
+    if "loading_list" not in shared:
+        path = ds.loading_list_xlsx(Path(shared["tmp"]) / "loading_list.xlsx")
+        shared["loading_list"] = path, discover_target_sheets(str(path))
+    return shared["loading_list"]
+
+
+CASES: List[Case] = [
+    Case("build_material_groups_from_details",
+         lambda ds, shared: ds.details,
+         lambda details: [build_material_groups_from_details(rows) for rows in details.values()]),
+    Case("build_material_groups_from_details[trusted]",
+         lambda ds, shared: ds.details,
+         lambda details: [build_material_groups_from_details(rows, trusted=True) for rows in details.values()]),
+    Case("scale_bom_template",
+         _templates,
+         lambda state: [scale_template(state[s.sku], s.mo, s.target_qty) for s in state["mo_status"]]),
+    Case("summary_delivery",
+         lambda ds, shared: ds.consumption,
+         lambda consumption: [summary_delivery(records) for records in consumption.values()]),
+    Case("overstock_calculation",
+         _handlers,
+         lambda handlers: [handler.overstock_calculation() for handler in handlers]),
+    Case("apply_pending_consumption",
+         _pending,
+         lambda state: apply_pending_consumption(*state)),
+    Case("demand_netting_queries",
+         lambda ds, shared: (*_pending(ds, shared), {status.mo: status.line for status in ds.mo_status}),
+         lambda state: DemandMatrix.from_groups(state[1]).net(state[0], state[2]).line_demand()),
+    Case("parse_swh_inventory",
+         lambda ds, shared: ds.swh_inventory_xlsx(),
+         parse_swh_inventory),
+    Case("iter_swh_inventory_batches",
+         lambda ds, shared: ds.swh_inventory_xlsx(),
+         lambda content: sum(len(batch["PKG_ID"]) for batch in iter_swh_inventory_batches(content))),
+    Case("swh_inventory_items",
+         lambda ds, shared: ds.swh_inventory_rows(),
+         lambda rows: [build(SWHInventoryItem, False, **row) for row in rows]),
+    Case("build_station_object",
+         _loading_list,
+         lambda state: [build_station_object(str(state[0]), sheet) for sheet in state[1]]),
+]
+
+
+def time_case(case: Case, ds: SyntheticDataset, shared: Dict[str, Any], repeat: int) -> Dict[str, Any]:
+    timings = []
+    for _ in range(repeat):
+        state = case.setup(ds, shared)
+        start = time.perf_counter()
+        case.run(state)
+        timings.append(time.perf_counter() - start)
+    return {"best": min(timings), "median": statistics.median(timings), "repeat": repeat}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def latest_result() -> Optional[Dict[str, Any]]:
+    files = sorted(RESULTS_DIR.glob("*.json"))
+    if not files:
+        return None
+    with files[-1].open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> List[str]:
+    regressions = []
+    for key, result in current["results"].items():
+        before = previous["results"].get(key)
+        if not before:
+            continue
+        ratio = result["best"] / before["best"] if before["best"] else float("inf")
+        marker = "REGRESSION" if ratio > REGRESSION_THRESHOLD else ""
+        print(f"  {key:<55} {before['best']:>9.4f}s -> {result['best']:>9.4f}s  x{ratio:5.2f} {marker}")
+        if marker:
+            regressions.append(key)
+    return regressions
+
+
+def run_bench(scales=DEFAULT_SCALES, cases: Optional[List[str]] = None, repeat: int = 3,
+              save: bool = True, inventory_rows: int = 0) -> Dict[str, Any]:
+    selected = [case for case in CASES if not cases or case.name in cases]
+    report: Dict[str, Any] = {
+        "revision": git_revision(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in scales:
+            start = time.perf_counter()
+            ds = SyntheticDataset(scale, inventory_rows=inventory_rows)
+            print(f"scale {scale} WOs: dataset in {time.perf_counter() - start:.1f}s "
+                  f"({sum(len(r) for r in ds.consumption.values())} reels, {ds.inventory_rows} SWH rows)")
+            shared: Dict[str, Any] = {"tmp": tmp}
+            for case in selected:
+                result = time_case(case, ds, shared, repeat)
+                report["results"][f"{case.name}@{scale}"] = result
+                print(f"  {case.name:<40} best {result['best']:.4f}s  median {result['median']:.4f}s")
+
+    previous = latest_result()
+    if save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESULTS_DIR / f"{datetime.now():%Y%m%d_%H%M%S}_{report['revision']}.json"
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"saved {path}")
+    if previous:
+        print(f"compared with {previous['revision']} ({previous['created']}):")
+        regressions = compare(report, previous)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over x{REGRESSION_THRESHOLD}")
+    return report
+
+
+if __name__ == "__main__":
+    # python -m bench.run_bench --scales 1 10 100 1000
+    parser = argparse.ArgumentParser(description="Benchmark the core supply-chain computations on synthetic data.")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES),
+                        help="numbers of work orders to generate (1 to 10000)")
+    parser.add_argument("--case", action="append", choices=[case.name for case in CASES],
+                        help="only run this case (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--inventory-rows", type=int, default=0,
+                        help="rows of the synthetic SWH export (default scales with the WO count)")
+    parser.add_argument("--no-save", action="store_true", help="do not store the results under bench/results")
+    args = parser.parse_args()
+    run_bench(args.scales, args.case, args.repeat, save=not args.no_save, inventory_rows=args.inventory_rows)
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import random
+from datetime import datetime, timedelta
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List
+
+from openpyxl import Workbook
+
+from cmd.smw_demand import MOStatus
+
+LINES = ["J01", "J02", "J03", "J05", "J06", "J08"]
+AREAS = ["W01", "W02", "WT01"]
+STD_PACKS = [1000, 2000, 3000, 4000, 5000, 10000]
+DFMS_DATE_FORMAT = "%a, %d %b %Y %H:%M:%S GMT"
+
+SWH_HEADERS = ["ReelId", "PN", "Lot", "Qty", "PositionCode", "AreaCode", "BoxCode", "Status", "CreateTime"]
+LOADING_LIST_HEADERS = ["Track/Z.No", "H.H P/N", "Feeder Type", "Parts Type", "Nozzle", "Quantity", "Plate Type",
+                        "Location"]
+
+
+class SyntheticDataset:
+    """
+    Realistic-shaped fake upstream data for n_wos work orders: SAP get_wo_detail rows, DFMS
+    getWO_PKGID consumption records, WO_STATUS records, an SWH stock export and a loading list.
+    Work orders share a small pool of SKUs (and therefore BOMs) like the real schedule does.
+    """
+
+    def __init__(
+        self,
+        n_wos: int,
+        *,
+        groups_per_wo: int = 120,
+        alternates_per_group: int = 2,
+        n_skus: int = 0,
+        inventory_rows: int = 0,
+        seed: int = 7,
+    ):
+        self.n_wos = n_wos
+        self.rng = random.Random(seed)
+        self.groups_per_wo = groups_per_wo
+        self.alternates_per_group = alternates_per_group
+        self.n_skus = n_skus or max(1, n_wos // 8)
+        self.inventory_rows = inventory_rows or min(200_000, 50 * n_wos + 1_000)
+
+        self._pkg_seq = 0
+        self.boms = {f"SKU{idx:04d}": self._bom() for idx in range(self.n_skus)}
+        self.part_numbers = sorted({pn for bom in self.boms.values() for _, pns in bom for pn, _ in pns})
+
+        self.mo_status: List[MOStatus] = []
+        self.details: Dict[str, List[Dict[str, str]]] = {}
+        self.consumption: Dict[str, List[Dict]] = {}
+        for idx in range(n_wos):
+            wo = f"000{390000000 + idx}"
+            sku = f"SKU{self.rng.randrange(self.n_skus):04d}"
+            target = self.rng.choice([500, 1000, 2000, 3500, 5000])
+            output = self.rng.randint(0, target)
+            self.mo_status.append(
+                MOStatus(id=f"id{idx}", mo=wo, line=self.rng.choice(LINES), sku=sku, ver="A00",
+                         target_qty=target, input_qty=output, output_qty=output)
+            )
+            self.details[wo] = self._detail_rows(wo, sku, target)
+            self.consumption[wo] = self._consumption_records(wo, self.details[wo])
+
+    def _next_pkg(self, prefix: str = "MPT") -> str:
+        self._pkg_seq += 1
+        return f"{prefix}{self._pkg_seq:013d}"
+
+    def _bom(self) -> List[tuple]:
+        bom = []
+        for _ in range(self.groups_per_wo):
+            high_level_pn = f"HL{self.rng.randrange(10 ** 7):07d}-00"
+            usage = self.rng.choice([1, 1, 1, 2, 2, 4, 8, 16])
+            pns = [(f"{self.rng.randrange(10 ** 8):08d}-{k:03d}-H", k == 0)
+                   for k in range(1 + self.rng.randint(0, self.alternates_per_group))]
+            bom.append(((high_level_pn, usage), pns))
+        return bom
+
+    def _detail_rows(self, wo: str, sku: str, units: int) -> List[Dict[str, str]]:
+        rows: List[Dict[str, str]] = []
+        for (high_level_pn, usage), pns in self.boms[sku]:
+            request = usage * units
+            rows.append({"CONTAINER_NO": "X", "LINE_NAME": high_level_pn, "SECTION_NAME": str(request),
+                         "COL_15": sku, "WORK_ORDER": wo})
+            attrition = int(request * self.rng.uniform(0.0, 0.03))
+            for pn, is_primary in pns:
+                qty = request + attrition if is_primary else self.rng.choice([0, 0, attrition])
+                rows.append({"CONTAINER_NO": "", "LINE_NAME": pn, "SECTION_NAME": str(qty), "COL_15": high_level_pn,
+                             "MODEL_NAME": "0010" if is_primary else "0020", "PALLET_NO": "CAP CER 0.1UF 16V",
+                             "COL_23": "45654", "COL_24": "20260212"})
+        return rows
+
+    def _consumption_records(self, wo: str, detail_rows: List[Dict[str, str]]) -> List[Dict]:
+        records: List[Dict] = []
+        start = datetime(2026, 1, 1) + timedelta(hours=self.rng.randrange(24 * 60))
+        line = f"SMT{self.rng.choice(LINES)}"
+        for row in detail_rows:
+            if row["CONTAINER_NO"] == "X" or int(row["SECTION_NAME"]) == 0:
+                continue
+            pack = self.rng.choice(STD_PACKS)
+            needed = int(int(row["SECTION_NAME"]) * self.rng.uniform(0.9, 1.4))
+            delivered = 0
+            while delivered < needed:
+                qty = pack if self.rng.random() > 0.1 else self.rng.randint(1, pack)
+                records.append({
+                    "CREATED_DATE": (start + timedelta(minutes=len(records))).strftime(DFMS_DATE_FORMAT),
+                    "EMP_NUMBER": str(self.rng.randint(40000, 49999)),
+                    "HH_PN": row["LINE_NAME"],
+                    "LINE_NAME": line,
+                    "MFR_PN": "PM1A112-11DA3-4H",
+                    "PKG_ID": self._next_pkg("XR" if self.rng.random() < 0.03 else "MPT"),
+                    "QTY": qty,
+                    "REMAIN_QTY": 0,
+                    "REMARKS": "WH ASIGNATION",
+                    "WO": wo,
+                    "rowNum": len(records) + 1,
+                })
+                delivered += qty
+        return records
+
+    def swh_inventory_rows(self) -> List[Dict]:
+        rows = []
+        for _ in range(self.inventory_rows):
+            rows.append({
+                "PKG_ID": self._next_pkg(self.rng.choice(["MPT", "MPT", "MPT", "HL"])),
+                "PN": self.rng.choice(self.part_numbers),
+                "QTY": self.rng.choice(STD_PACKS),
+                "POSITION_CODE": f"A-{self.rng.randint(1, 9)}-{self.rng.randint(1, 40)}-{self.rng.randint(1, 9)}-"
+                                 f"{self.rng.randint(1, 9)}_A",
+                "AREA_CODE": self.rng.choice(AREAS),
+            })
+        return rows
+
+    def swh_inventory_xlsx(self) -> bytes:
+        """The SWH exportMaterialStockToExcel payload, with the extra columns the real export carries."""
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Sheet1")
+        sheet.append(SWH_HEADERS)
+        for row in self.swh_inventory_rows():
+            sheet.append([row["PKG_ID"], row["PN"], "LOT1", row["QTY"], row["POSITION_CODE"], row["AREA_CODE"],
+                          "BOX1", "IN", "2026-02-12 21:51:00"])
+        buffer = BytesIO()
+        workbook.save(buffer)
+        return buffer.getvalue()
+
+    def loading_list_xlsx(self, path: str | Path, sheets: int = 8, tracks_per_sheet: int = 120) -> Path:
+        """A loading-list workbook in the layout cmd.loading_list_ex_2.build_station_object parses."""
+        path = Path(path)
+        workbook = Workbook()
+        workbook.remove(workbook.active)
+        for idx in range(sheets):
+            sheet = workbook.create_sheet(f"{'TB'[idx % 2]}{idx + 1}")
+            sheet.append(["File Coding: LL-XF2C1", None, "Rev: A01"])
+            sheet.append([f"Line: {self.rng.choice(LINES)}", None, f"Board Side: {'TOP' if idx % 2 else 'BOT'}"])
+            sheet.append([f"Machine: NXT{idx:02d}"])
+            sheet.append([])
+            sheet.append(LOADING_LIST_HEADERS)
+            for track in range(tracks_per_sheet):
+                pn = self.rng.choice(self.part_numbers)
+                sheet.append([f"{track + 1}", pn, "8MM", "0402", "N1", self.rng.randint(1, 12), "P8",
+                              ",".join(f"C{self.rng.randint(1, 999)}" for _ in range(3))])
+                for _ in range(self.rng.randint(0, 2)):
+                    sheet.append(["@", self.rng.choice(self.part_numbers)])
+        workbook.save(path)
+        return path
@@ -0,0 +1,55 @@
+import argparse
+import json
+from typing import List
+
+import pandas as pd
+
+from util.concurrency import DEFAULT_MAX_WORKERS, bounded_map
+from util.consumption_store import DEFAULT_DB_PATH, ConsumptionStore
+from util.get_wo_pn_deliver_to_production import DFMS_GET_WO_PN_URL
+from util.wo_details import call_api
+
+
+def read_wo_list(path: str) -> List[str]:
+    wo_df = pd.read_excel(path)
+    return [f"000{wo}" for wo in wo_df["SAP_WO"]]
+
+
+def ingest_consumption(
+    wos: List[str],
+    json_paths: List[str],
+    db_path: str = str(DEFAULT_DB_PATH),
+    max_workers: int = DEFAULT_MAX_WORKERS,
+):
+    with ConsumptionStore(db_path) as store:
+        for path in json_paths:
+            with open(path, "r") as f:
+                rows = store.ingest(json.load(f))
+            print(f"{path}: {rows} records")
+
+        for result in bounded_map(
+            lambda wo: call_api(f"{DFMS_GET_WO_PN_URL}workorder={wo}"), wos, max_workers=max_workers
+        ):
+            if not result.ok:
+                print(f"failed {result.item}: {result.error}")
+                continue
+            rows = store.ingest_wo(result.item, result.value)
+            print(f"{result.item}: {rows} records")
+
+        print(f"warehouse {db_path}: {len(store.wos())} WOs")
+
+
+if __name__ == "__main__":
+    # python -m cmd.ingest_consumption --wo-list resources/work_order_list.xlsx
+    parser = argparse.ArgumentParser(description="Load DFMS consumption records into the local DuckDB warehouse.")
+    parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="warehouse file")
+    parser.add_argument("--wo", action="append", default=[], help="work order to download (repeatable)")
+    parser.add_argument("--wo-list", help="Excel file with a SAP_WO column, e.g. resources/work_order_list.xlsx")
+    parser.add_argument("--json", action="append", default=[], help="saved getWO_PKGID JSON file (repeatable)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    args = parser.parse_args()
+
+    _wos = list(args.wo)
+    if args.wo_list:
+        _wos += read_wo_list(args.wo_list)
+    ingest_consumption(_wos, args.json, args.db, args.workers)
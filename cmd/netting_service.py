@@ -0,0 +1,187 @@
+import argparse
+import heapq
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import requests
+
+from cmd.smw_demand import LINES, MO_STATUS_FIELDS, POCKET_BASE_URL, MOStatus, set_pending_consumption, step_2
+from util.concurrency import DEFAULT_MAX_WORKERS
+from util.demand_netting import DemandMatrix
+from util.inventory_store import InventoryStore
+from util.pocketbase import all_of, any_of, iter_records, quote
+from util.swh_snapshot import DEFAULT_SYNC_SECONDS, SwhSnapshotStore
+from util.wo_details import MaterialGroup
+
+WATCH_FIELDS = list(MO_STATUS_FIELDS.values()) + ["IS_RUNNING", "updated"]
+DEFAULT_POLL_SECONDS = 5
+
+
+def mo_demand(mo: str, groups: List[MaterialGroup]) -> Dict[str, float]:
+    """{pn: pending qty} of one MO, split like apply_pending_consumption."""
+    matrix = DemandMatrix.from_groups({mo: groups})
+    return dict(zip(matrix.pns, matrix.demand().tolist()))
+
+
+class NettingService:
+    """
+    Stock minus pending consumption kept in memory between polls. Each poll reads only
+    the WO_STATUS records updated since the last one and the SWH snapshot delta, and
+    re-nets only the part numbers those touched: a new MO has its BOM fetched once, an MO
+    whose output moved has its pending consumption recomputed, and a stopped MO is dropped.
+    """
+
+    def __init__(
+        self,
+        base_url: str = POCKET_BASE_URL,
+        lines: Sequence[str] = LINES,
+        snapshot: Optional[SwhSnapshotStore] = None,
+        *,
+        trusted: bool = False,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        inventory_max_age_seconds: float = DEFAULT_SYNC_SECONDS,
+    ):
+        self.base_url = base_url
+        self.lines = list(lines)
+        self.snapshot = snapshot if snapshot is not None else SwhSnapshotStore()
+        self.trusted = trusted
+        self.max_workers = max_workers
+        self.inventory_max_age_seconds = inventory_max_age_seconds
+
+        self.records: Dict[str, MOStatus] = {}
+        self.groups: Dict[str, List[MaterialGroup]] = {}
+        self.demand_by_mo: Dict[str, Dict[str, float]] = {}
+        self.stock: Dict[str, float] = {}
+        self.net: Dict[str, float] = {}
+        self._mos_by_pn: Dict[str, Set[str]] = {}
+        self._watermark: Optional[str] = None
+        self._synced_at: Optional[float] = None
+
+    def _read_wo_status(self, filter: str) -> List[Dict[str, Any]]:
+        return list(iter_records(self.base_url, "WO_STATUS", filter=filter, fields=WATCH_FIELDS,
+                                 max_workers=self.max_workers))
+
+    def start(self) -> Set[str]:
+        """Full load: every running MO of the lines and the whole stock."""
+        rows = self._read_wo_status(all_of("IS_RUNNING=true", any_of("DEFAULT_LINE", self.lines)))
+        return self._apply_wo_rows(rows) | self._refresh_stock()
+
+    def poll(self) -> Set[str]:
+        """Apply what changed since the last call; returns the part numbers whose net moved."""
+        if self._watermark is None:
+            return self.start()
+        # >=: records written within the same millisecond as the watermark are read again, which is harmless
+        rows = self._read_wo_status(f"updated>={quote(self._watermark)}")
+        return self._apply_wo_rows(rows) | self._refresh_stock()
+
+    def _apply_wo_rows(self, rows: Iterable[Dict[str, Any]]) -> Set[str]:
+        changed: Set[str] = set()
+        for row in rows:
+            if row.get("updated") and (self._watermark is None or row["updated"] > self._watermark):
+                self._watermark = row["updated"]
+            mo = row.get("MO_NUMBER")
+            if not row.get("IS_RUNNING") or row.get("DEFAULT_LINE") not in self.lines:
+                changed |= self._drop(mo)
+                continue
+
+            try:
+                record = MOStatus(**{field: row.get(column) for field, column in MO_STATUS_FIELDS.items()})
+            except ValueError as e:  # pydantic's ValidationError: one bad row must not stop the service
+                print(f"skipping WO_STATUS row {row.get('id')} ({mo}): {e}")
+                continue
+            known = self.records.get(mo)
+            self.records[mo] = record
+            if known is None or mo not in self.groups:
+                continue
+            if (known.sku, known.ver) != (record.sku, record.ver):
+                del self.groups[mo]  # another BOM: fetched again below
+                changed |= self._set_demand(mo)  # the old BOM's demand goes even if the refetch fails
+                continue
+            if (known.target_qty, known.output_qty) != (record.target_qty, record.output_qty):
+                set_pending_consumption(record, self.groups[mo])
+                changed |= self._set_demand(mo)
+
+        # New MOs, and ones whose details failed before
+        missing = [record for mo, record in self.records.items() if mo not in self.groups]
+        if missing:
+            for mo, groups in step_2(missing, self.trusted, max_workers=self.max_workers).items():
+                self.groups[mo] = groups
+                changed |= self._set_demand(mo)
+        self._renet(changed)
+        return changed
+
+    def _drop(self, mo: str) -> Set[str]:
+        if mo not in self.records:
+            return set()
+        del self.records[mo]
+        self.groups.pop(mo, None)
+        return self._set_demand(mo)
+
+    def _set_demand(self, mo: str) -> Set[str]:
+        old = self.demand_by_mo.pop(mo, {})
+        new = mo_demand(mo, self.groups[mo]) if mo in self.groups else {}
+        if new:
+            self.demand_by_mo[mo] = new
+        for pn in old.keys() - new.keys():
+            self._mos_by_pn[pn].discard(mo)
+        for pn in new:
+            self._mos_by_pn.setdefault(pn, set()).add(mo)
+        return {pn for pn in old.keys() | new.keys() if old.get(pn) != new.get(pn)}
+
+    def _refresh_stock(self) -> Set[str]:
+        snapshot = self.snapshot.current(self.inventory_max_age_seconds)
+        if snapshot.synced_at == self._synced_at:
+            return set()
+        self._synced_at = snapshot.synced_at
+        totals = InventoryStore.from_snapshot(snapshot).totals()
+        changed = {pn for pn in totals.keys() | self.stock.keys() if totals.get(pn) != self.stock.get(pn)}
+        self.stock = totals
+        self._renet(changed)
+        return changed
+
+    def _renet(self, pns: Iterable[str]) -> None:
+        for pn in pns:
+            mos = self._mos_by_pn.get(pn)
+            if not mos:
+                self._mos_by_pn.pop(pn, None)
+                if pn not in self.stock:
+                    self.net.pop(pn, None)
+                    continue
+            # Summed from the per-MO demand each time, so repeated updates do not accumulate rounding
+            demand = sum(self.demand_by_mo[mo][pn] for mo in mos or ())
+            self.net[pn] = self.stock.get(pn, 0) - demand
+
+    def shortages(self, n: int = 20) -> List[Tuple[str, float]]:
+        """The n largest shortfalls, largest first."""
+        short = heapq.nsmallest(n, ((qty, pn) for pn, qty in self.net.items() if qty < 0))
+        return [(pn, -qty) for qty, pn in short]
+
+    def run(self, interval_seconds: float = DEFAULT_POLL_SECONDS, top: int = 20) -> None:
+        self.start()
+        print(json.dumps(self.shortages(top), indent=2))
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                changed = self.poll()
+            except (RuntimeError, requests.RequestException) as e:
+                print(f"poll failed, keeping the last balances: {e}")
+                continue
+            if changed:
+                print(f"{datetime.now():%H:%M:%S} {len(changed)} PNs changed, {len(self.records)} MOs")
+                print(json.dumps(self.shortages(top), indent=2))
+
+
+if __name__ == "__main__":
+    # python -m cmd.netting_service --interval 5 --top 20
+    parser = argparse.ArgumentParser(description="Keep the stock minus pending consumption current as lines report output.")
+    parser.add_argument("--interval", type=float, default=DEFAULT_POLL_SECONDS, help="seconds between polls")
+    parser.add_argument("--top", type=int, default=20, help="shortages to print")
+    parser.add_argument("--inventory-max-age", type=float, default=DEFAULT_SYNC_SECONDS,
+                        help="seconds before the SWH snapshot is synced again")
+    parser.add_argument("--trusted", action="store_true", help="skip validation of SAP detail rows")
+    args = parser.parse_args()
+
+    _service = NettingService(trusted=args.trusted, inventory_max_age_seconds=args.inventory_max_age)
+    _service.run(args.interval, args.top)
@@ -1,19 +1,26 @@
+import json
+from typing import Optional
+
 import pandas as pd
 
+from util.inventory_store import InventoryStore
+
+SWH_DATA_PATH = r"C:\data\ie_tool_2_source\db\planing_db\ref_data\swh_data.json"
+STOCK_AREAS = ("W01", "W02")
 
-def report_swh_vs_sap():
+
+def report_swh_vs_sap(inventory: Optional[InventoryStore] = None):
     sap_inventory = pd.read_excel(
         r"C:\data\ie_tool_2_source\db\planing_db\ref_data\sLOC_1001.xlsx"
     )
 
     sap_inventory = sap_inventory[["Material", "Unrestricted"]]
 
-    swh_inventory = pd.read_json(
-        r"C:\data\ie_tool_2_source\db\planing_db\ref_data\swh_data.json"
-    )
-    swh_inventory = swh_inventory[swh_inventory["AREA_CODE"].isin(["W01", "W02"])]
+    if inventory is None:
+        with open(SWH_DATA_PATH, "r", encoding="utf-8") as f:
+            inventory = InventoryStore.from_records(json.load(f))
 
-    by_pn = swh_inventory.groupby("PN", as_index=False).agg(total_qty=("QTY", "sum"))
+    by_pn = pd.DataFrame(list(inventory.totals(STOCK_AREAS).items()), columns=["PN", "total_qty"])
 
     sap_discrepancies = sap_inventory.merge(
         by_pn, left_on="Material", right_on="PN", how="left"
@@ -1,13 +1,21 @@
 import json
-from typing import List, Dict
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Dict, Optional, Sequence
 
-import requests
 from pydantic import BaseModel
 
+from util.bom_template import BomTemplateCache
+from util.concurrency import DEFAULT_MAX_WORKERS, bounded_map
+from util.demand_netting import DemandMatrix, NettingResult
+from util.inventory_store import InventoryStore
+from util.pocketbase import PocketBaseError, all_of, any_of, iter_records, quote
 from util.smw_stock import get_swh_inventory
-from util.wo_details import get_wo_details, MaterialGroup
+from util.swh_snapshot import SwhSnapshotStore
+from util.wo_details import build_material_groups_by_wo, get_wo_detail_rows, MaterialGroup
 
 POCKET_BASE_URL = 'http://10.13.32.220:8090'
+LINES = ['J01', 'J02', 'J03', 'J05', 'J06', 'J08']
 
 
 class MOStatus(BaseModel):
@@ -21,6 +29,19 @@ class MOStatus(BaseModel):
     output_qty: int
 
 
+# MOStatus field -> WO_STATUS column
+MO_STATUS_FIELDS = {
+    "id": "id",
+    "mo": "MO_NUMBER",
+    "line": "DEFAULT_LINE",
+    "sku": "MODEL_NAME",
+    "ver": "VERSION_CODE",
+    "target_qty": "TARGET_QTY",
+    "input_qty": "INPUT_QTY",
+    "output_qty": "OUTPUT_QTY",
+}
+
+
 def step_1()-> list[MOStatus] | None:
     # http://10.13.32.220:8090/api/collections/WO_STATUS/records
     # "BIOS_REV": "1.31.1",
@@ -48,84 +69,132 @@ def step_1()-> list[MOStatus] | None:
     # "id": "qej2hhruys09abb",
     # "updated": "2026-02-20 15:31:03.738Z"
 
-    data: list[MOStatus] = []
-    call = requests.get(f'{POCKET_BASE_URL}/api/collections/WO_STATUS/records?filter=(IS_RUNNING = true)')
-
-    if call.status_code != 200:
+    try:
+        return list(iter_mo_status())
+    except PocketBaseError as e:
+        print(f"WO_STATUS: {e}")
         return None
 
-    for records in call.json().get('items'):
-        if records.get('DEFAULT_LINE') in ['J01', 'J02', 'J03', 'J05', 'J06', 'J08']:
-            data.append(
-                MOStatus(
-                    id=records.get('id'),
-                    mo=records.get('MO_NUMBER'),
-                    line=records.get('DEFAULT_LINE'),
-                    sku=records.get('MODEL_NAME'),
-                    ver=records.get('VERSION_CODE'),
-                    target_qty=records.get('TARGET_QTY'),
-                    input_qty=records.get('INPUT_QTY'),
-                    output_qty=records.get('OUTPUT_QTY'))
-            )
-
-    return data
-
-
-def step_2(data: list[MOStatus]) -> Dict[str, List[MaterialGroup]]:
-
-    wo_list: Dict[str, List[MaterialGroup]] = {}
 
+def iter_mo_status(
+    base_url: str = POCKET_BASE_URL,
+    lines: Sequence[str] = LINES,
+    running: bool = True,
+) -> Iterator[MOStatus]:
+    """WO_STATUS records of the given lines, all pages, with only the columns MOStatus needs."""
+    records = iter_records(
+        base_url,
+        "WO_STATUS",
+        filter=all_of(f"IS_RUNNING={quote(running)}", any_of("DEFAULT_LINE", lines)),
+        fields=list(MO_STATUS_FIELDS.values()),
+    )
+    for record in records:
+        yield MOStatus(**{field: record.get(column) for field, column in MO_STATUS_FIELDS.items()})
+
+
+def set_pending_consumption(record: MOStatus, groups: List[MaterialGroup]) -> None:
+    pcb_pending_qty: int = record.target_qty - record.output_qty
+    for group in groups:
+        _left = group.consumption_qty * pcb_pending_qty
+        group.pending_consumption = _left
+
+
+def step_2(
+    data: list[MOStatus],
+    trusted: bool = False,
+    templates: Optional[BomTemplateCache] = None,
+    verify: bool = False,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    failures: Optional[Dict[str, BaseException]] = None,
+) -> Dict[str, List[MaterialGroup]]:
+    """
+    Material groups of every MO with its pending consumption. With templates, only the
+    first MO of each SKU/version is downloaded from SAP; the others are scaled from it.
+    MOs are fetched concurrently, at most max_workers at a time. An MO whose details
+    could not be fetched is reported, added to failures if given, and left out.
+    """
+    records = {record.mo: record for record in data}
+
+    def fetch(mo: str):
+        if templates is None:
+            return get_wo_detail_rows(mo)
+        record = records[mo]
+        return templates.get_wo_details(mo, record.sku, record.ver, record.target_qty, trusted=trusted, verify=verify)
+
+    fetched: Dict[str, object] = {}
+    for result in bounded_map(fetch, records, max_workers=max_workers):
+        if result.ok:
+            fetched[result.item] = result.value
+        else:
+            print(f"failed {result.item}: {result.error}")
+            if failures is not None:
+                failures[result.item] = result.error
+
+    # Back in input order, whatever order the calls finished in
+    fetched = {mo: fetched[mo] for mo in records if mo in fetched}
+    if templates is None:
+        wo_list: Dict[str, List[MaterialGroup]] = build_material_groups_by_wo(fetched, trusted=trusted)
+    else:
+        wo_list = fetched
 
     for record in data:
-        pcb_pending_qty: int = record.target_qty - record.output_qty
-        wo_details = get_wo_details(record.mo)
-
-        for group in wo_details:
-            _left = group.consumption_qty * pcb_pending_qty
-            group.pending_consumption = _left
-        wo_list[record.mo] = wo_details
+        if record.mo in wo_list:
+            set_pending_consumption(record, wo_list[record.mo])
     return wo_list
 
-def step_3()->Dict[str, float]:
-    inventory = get_swh_inventory()
-    summary: Dict[str, float] = {}
-
-    for item in inventory:
-        if not item.PN:
-            continue
-        qty = float(item.QTY or 0)
-        summary[item.PN] = summary.get(item.PN, 0) + qty
-
-    return summary
+def step_3(snapshot: Optional[SwhSnapshotStore] = None)->Dict[str, float]:
+    if snapshot is not None:
+        inventory = InventoryStore.from_snapshot(snapshot.current())
+    else:
+        inventory = InventoryStore.from_items(get_swh_inventory())
+    return inventory.totals()
 
 def apply_pending_consumption(
     inventory: Dict[str, float],
     wo_list: Dict[str, List[MaterialGroup]],
 ) -> Dict[str, float]:
-    for key, wo in wo_list.items():
-        for group in wo:
-            if group.pending_consumption == 0 or group.request_qty <= 0:
-                continue
-            for material in group.materials:
-                if material.request_qty > 0:
-                    pending_for_material = group.pending_consumption * (
-                        material.request_qty / group.request_qty
-                    )
-                    current = inventory.get(material.part_number)
-                    if current is None:
-                        inventory[material.part_number] = -pending_for_material
-                    else:
-                        inventory[material.part_number] = current - pending_for_material
-    return inventory
-
-def ana_main():
+    """{pn: stock - pending consumption}, as a new dict; see net_pending_consumption."""
+    return net_pending_consumption(inventory, wo_list).as_dict()
+
+
+def net_pending_consumption(
+    inventory: Dict[str, float],
+    wo_list: Dict[str, List[MaterialGroup]],
+    data: Optional[List[MOStatus]] = None,
+) -> NettingResult:
+    """
+    Net the pending consumption of every MO against the stock. With the MOStatus records,
+    the result can also split each PN's demand by production line.
+    """
+    lines = None if data is None else {record.mo: record.line for record in data}
+    return DemandMatrix.from_groups(wo_list).net(inventory, lines)
+
+def ana_main(
+    trusted: bool = False,
+    use_templates: bool = False,
+    verify: bool = False,
+    snapshot: Optional[SwhSnapshotStore] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+):
     mo = step_1()
     if mo is None:
         return
 
-    wo_list = step_2(mo)
-    summary = step_3()
-    adjusted = apply_pending_consumption(summary, wo_list)
-    adjusted = sorted(adjusted.items(), key=lambda x: x[1], reverse=True)
+    with BomTemplateCache() if use_templates else nullcontext() as templates:
+        # The stock download does not depend on the BOMs: run it while step_2 waits on SAP
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            stock = pool.submit(step_3, snapshot)
+            failures: Dict[str, BaseException] = {}
+            wo_list = step_2(mo, trusted, templates, verify, max_workers=max_workers, failures=failures)
+            summary = stock.result()
+        if failures:
+            print(f"{len(failures)} of {len(mo)} MOs left out: {', '.join(failures)}")
+        if templates is not None:
+            # Verification ran in the background during step_3; swap in the real BOM where a template was off
+            records = {record.mo: record for record in mo}
+            for wo, groups in templates.wait_verified().items():
+                set_pending_consumption(records[wo], groups)
+                wo_list[wo] = groups
+    netting = net_pending_consumption(summary, wo_list, mo)
+    adjusted = sorted(netting.as_dict().items(), key=lambda x: x[1], reverse=True)
     print(json.dumps(adjusted, indent=2))
-
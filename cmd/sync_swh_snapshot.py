@@ -0,0 +1,16 @@
+import argparse
+
+from util.swh_snapshot import DEFAULT_FULL_REFRESH_SECONDS, DEFAULT_SNAPSHOT_PATH, SwhSnapshotStore
+
+if __name__ == "__main__":
+    # python -m cmd.sync_swh_snapshot          (e.g. every few minutes from the task scheduler)
+    parser = argparse.ArgumentParser(description="Update the local SWH stock snapshot from the warehouse export.")
+    parser.add_argument("--path", default=str(DEFAULT_SNAPSHOT_PATH), help="snapshot file")
+    parser.add_argument("--full", action="store_true", help="download the whole warehouse instead of a delta")
+    parser.add_argument("--full-every", type=float, default=DEFAULT_FULL_REFRESH_SECONDS / 3600,
+                        help="hours between automatic full refreshes")
+    args = parser.parse_args()
+
+    _store = SwhSnapshotStore(args.path, full_refresh_seconds=args.full_every * 3600)
+    _snapshot = _store.sync(full=args.full)
+    print(f"{args.path}: {len(_snapshot)} reels")
@@ -1,9 +1,10 @@
 import json
 from typing import List
 from pathlib import Path
-import requests
 from pydantic import BaseModel
 
+from util import http_client
+
 
 class Material(BaseModel):
     primary_hh_pn: str
@@ -124,7 +125,7 @@ def upload_ll_to_pb(
     #     "smt": "JSON",
     #     "pth": "JSON"
     # };
-    result = requests.post(f'{url}/api/collections/LOADING_LIST/records',
+    result = http_client.post(f'{url}/api/collections/LOADING_LIST/records',
                            json=dict(ref=ref, line=line, sku=sku, rev=rev, smt=smt, pth=pth))
 
     if result.status_code == 200:
@@ -170,7 +171,7 @@ def create_material_in_pb(db_ip: str,sheet:str,id: str, category: str, ref: str,
         "feeder_type": record.feeder_type,
         "category": category
     }
-    result = requests.post(f"{db_ip}/api/collections/LOADING_LIST_PN/records", json=data)
+    result = http_client.post(f"{db_ip}/api/collections/LOADING_LIST_PN/records", json=data)
 
 
 def run_ll_upload(db_ip: str,path: str, ref: str , category: str = "SMT", ):
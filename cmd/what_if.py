@@ -0,0 +1,143 @@
+import argparse
+import json
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel
+
+from cmd.smw_demand import MOStatus, step_1, step_2, step_3
+from util.concurrency import DEFAULT_MAX_WORKERS
+from util.demand_netting import DemandMatrix
+from util.report_writer import ReportFormat, write_report
+from util.wo_details import MaterialGroup
+
+SHORTAGE_COLUMNS = ["scenario", "pn", "stock", "demand", "shortfall"]
+
+
+class Scenario(BaseModel):
+    name: str
+    target_qty: Dict[str, int] = {}  # MO -> new target; what is left is target - output
+    extra_units: Dict[str, int] = {}  # MO -> units added to what is left to build
+    lines_off: List[str] = []  # lines that build nothing
+
+
+class ScenarioEngine:
+    """
+    Evaluates what-if scenarios against the current stock in one pass. The demand of one
+    unit of each MO is a (part number x MO) matrix built once; a batch of scenarios is a
+    (MO x scenario) matrix of units left to build, so their demand is one product and
+    their net stock one subtraction.
+    """
+
+    def __init__(self, wo_list: Dict[str, List[MaterialGroup]], inventory: Dict[str, float], data: Sequence[MOStatus]):
+        records = {record.mo: record for record in data}
+        matrix = DemandMatrix.per_unit({mo: groups for mo, groups in wo_list.items() if mo in records})
+        self.mos = matrix.mos
+        self._mo_index = {mo: idx for idx, mo in enumerate(self.mos)}
+
+        # Stock part numbers first, then the ones only demanded, as apply_pending_consumption orders them
+        self.pns = list(inventory)
+        pn_index = {pn: idx for idx, pn in enumerate(self.pns)}
+        for pn in matrix.pns:
+            if pn not in pn_index:
+                pn_index[pn] = len(self.pns)
+                self.pns.append(pn)
+        self.stock = np.zeros(len(self.pns))
+        self.stock[: len(inventory)] = np.fromiter(inventory.values(), dtype=float, count=len(inventory))
+        self.per_unit = np.zeros((len(self.pns), len(self.mos)))
+        self.per_unit[[pn_index[pn] for pn in matrix.pns]] = matrix.dense()
+
+        self.output_qty = np.array([records[mo].output_qty for mo in self.mos], dtype=float)
+        self.pending_units = np.array([records[mo].target_qty for mo in self.mos], dtype=float) - self.output_qty
+        self.lines = np.array([records[mo].line for mo in self.mos], dtype=object)
+
+    def units(self, scenarios: Sequence[Scenario]) -> np.ndarray:
+        """Units left to build, len(mos) x len(scenarios)."""
+        units = np.repeat(self.pending_units[:, None], len(scenarios), axis=1)
+        for col, scenario in enumerate(scenarios):
+            for mo, target in scenario.target_qty.items():
+                units[self._index(mo, scenario), col] = target - self.output_qty[self._mo_index[mo]]
+            for mo, extra in scenario.extra_units.items():
+                units[self._index(mo, scenario), col] += extra
+            if scenario.lines_off:
+                units[np.isin(self.lines, scenario.lines_off), col] = 0
+        return units
+
+    def _index(self, mo: str, scenario: Scenario) -> int:
+        idx = self._mo_index.get(mo)
+        if idx is None:
+            raise ValueError(f"scenario {scenario.name}: MO {mo} is not running")
+        return idx
+
+    def demand(self, scenarios: Sequence[Scenario]) -> np.ndarray:
+        """Pending demand, len(pns) x len(scenarios)."""
+        return self.per_unit @ self.units(scenarios)
+
+    def evaluate(self, scenarios: Sequence[Scenario], top: Optional[int] = None) -> pd.DataFrame:
+        """
+        Shortages of every scenario as one table (SHORTAGE_COLUMNS), largest first within
+        each scenario, at most top rows per scenario. groupby("scenario") splits it.
+        """
+        demand = self.demand(scenarios)
+        net = self.stock[:, None] - demand
+        cols, rows = np.nonzero((net < 0).T)
+        shortfall = -net[rows, cols]
+        order = np.lexsort((-shortfall, cols))
+        cols, rows, shortfall = cols[order], rows[order], shortfall[order]
+
+        if top is not None:
+            # Position of each row within its scenario: rows are grouped by scenario already
+            starts = np.searchsorted(cols, cols)
+            keep = np.arange(len(cols)) - starts < top
+            cols, rows, shortfall = cols[keep], rows[keep], shortfall[keep]
+
+        names = np.array([scenario.name for scenario in scenarios], dtype=object)
+        pns = np.array(self.pns, dtype=object)
+        return pd.DataFrame(
+            {
+                "scenario": names[cols],
+                "pn": pns[rows],
+                "stock": self.stock[rows],
+                "demand": demand[rows, cols],
+                "shortfall": shortfall,
+            },
+            columns=SHORTAGE_COLUMNS,
+        )
+
+
+def load_scenarios(path: str) -> List[Scenario]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [Scenario(**scenario) for scenario in json.load(f)]
+
+
+def what_if_main(
+    scenarios: List[Scenario],
+    top: Optional[int] = None,
+    trusted: bool = False,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> Optional[pd.DataFrame]:
+    mo = step_1()
+    if mo is None:
+        return None
+    wo_list = step_2(mo, trusted, max_workers=max_workers)
+    engine = ScenarioEngine(wo_list, step_3(), mo)
+    return engine.evaluate([Scenario(name="baseline"), *scenarios], top)
+
+
+if __name__ == "__main__":
+    # python -m cmd.what_if scenarios.json --top 50
+    # scenarios.json: [{"name": "J08 down", "lines_off": ["J08"]},
+    #                  {"name": "J03 +2000", "extra_units": {"000390019380": 2000}}]
+    parser = argparse.ArgumentParser(description="Shortages of the running MOs under what-if scenarios.")
+    parser.add_argument("scenarios", help="JSON list of scenarios (name, target_qty, extra_units, lines_off)")
+    parser.add_argument("--top", type=int, default=None, help="shortages kept per scenario")
+    parser.add_argument("--output", default="reports/what_if.xlsx")
+    parser.add_argument("--format", choices=[f.value for f in ReportFormat], default=None)
+    parser.add_argument("--trusted", action="store_true", help="skip validation of SAP detail rows")
+    args = parser.parse_args()
+
+    _table = what_if_main(load_scenarios(args.scenarios), args.top, args.trusted)
+    if _table is not None:
+        print(_table.groupby("scenario", sort=False)["shortfall"].agg(["count", "sum"]))
+        print(write_report(_table, args.output, args.format))
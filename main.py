@@ -7,6 +7,9 @@ from typing import List, Optional, Dict, Counter
 import pandas as pd
 from pydantic import BaseModel
 
+from util.consumption_store import ConsumptionStore
+from util.json_stream import iter_json_file
+from util.report_writer import ReportFormat, write_report
 
 
 class PartNumber(BaseModel):
@@ -180,7 +183,7 @@ class Materials(BaseModel):
             else:
                 self.pth.append(i)
 
-    def create_detail(self, total_units=0):
+    def create_detail(self, total_units=0, report_format: Optional[ReportFormat] = None):
         grouped: Dict[str, List[Material]] = defaultdict(list)
 
         for m in self.materials:
@@ -208,8 +211,7 @@ class Materials(BaseModel):
 
 
         # Save to excel
-        df = pd.DataFrame(_summary_vpn)
-        df.to_excel("summary.xlsx", index=False)
+        write_report(_summary_vpn, "summary.xlsx", report_format)
 
 
 
@@ -246,10 +248,15 @@ def format_requirement(path: str, bom_areas_path: str,deliver_path: str, total_u
     _materials.create_detail(total_units=total_units)
 
 
-def summary_delivery(path: str):
-    # Read a json file
-    with open(path, "r") as f:
-        consumption = json.load(f)
+def summary_delivery(path: str, store: Optional[ConsumptionStore] = None, wo: Optional[str] = None):
+    if store is not None:
+        # The warehouse already has the records typed and ordered, aggregate in SQL
+        with open("summary_consumption.json", "w") as f:
+            json.dump(store.pn_packages(wo), f, indent=4)
+        return
+
+    # Stream the json file record by record
+    consumption = iter_json_file(path)
     # {
     #     "CREATED_DATE": "Thu, 18 Dec 2025 11:55:42 GMT",
     #     "EMP_NUMBER": "45654",
@@ -265,9 +272,11 @@ def summary_delivery(path: str):
     # }
     # Create a report
 
-    _consumptionByPN = {i["HH_PN"]: {"pkg": [], "qtys":[]} for i in consumption}
+    _consumptionByPN = {}
 
     for i in consumption:
+        if i["HH_PN"] not in _consumptionByPN:
+            _consumptionByPN[i["HH_PN"]] = {"pkg": [], "qtys": []}
         _consumptionByPN[i["HH_PN"]]["qtys"].append(i["QTY"])
         _consumptionByPN[i["HH_PN"]]["pkg"].append(i["PKG_ID"])
 
@@ -282,22 +291,24 @@ def summary_delivery(path: str):
     #     print(pn, sum(qtys))
 
 
-def find_pn_in_deliver(path:str, pn: List[str]):
-    with open(path, "r") as f:
-        deliver = json.load(f)
-
-    _temp = []
-    for item in deliver:
-        if item["HH_PN"] in pn:
-            _temp.append(item)
+def find_pn_in_deliver(path:str, pn: List[str], store: Optional[ConsumptionStore] = None, wo: Optional[str] = None,
+                       report_format: Optional[ReportFormat] = None):
+    if store is not None:
+        # Already typed and sorted by CREATED_DATE
+        _df = store.find_pn(pn, wo=wo)
+    else:
+        _temp = []
+        for item in iter_json_file(path):
+            if item["HH_PN"] in pn:
+                _temp.append(item)
 
-    _df = pd.DataFrame(_temp)
-    _df["CREATED_DATE"] = pd.to_datetime(_df["CREATED_DATE"])
+        _df = pd.DataFrame(_temp)
+        _df["CREATED_DATE"] = pd.to_datetime(_df["CREATED_DATE"])
 
-    _df.sort_values("CREATED_DATE", inplace=True)
+        _df.sort_values("CREATED_DATE", inplace=True)
 
     _df.reset_index(inplace=True, drop=True)
-    _df.to_excel("pn_in.xlsx", index=False)
+    write_report(_df, "pn_in.xlsx", report_format)
     # to excel
 
 
@@ -1,35 +1,27 @@
-from collections import Counter
-
-import requests
+from pathlib import Path
+from typing import Optional
 
 from cmd.smw_demand import POCKET_BASE_URL
+from util.inventory_store import InventoryStore
 from util.smw_stock import get_swh_inventory
+from util.std_pkg import DEFAULT_SWH_PATH, StdPkgEstimator, upsert_std_pkg
+from util.swh_snapshot import SwhSnapshotStore
 
-POCKET_BASE_URL = "http://10.13.32.220:8090/api/collections/STD_PKG/records"
-
-
-def swh_to_pkg_id():
-    def most_common_number(nums):
-        if not nums:
-            return None  # or raise ValueError
-        return Counter(nums).most_common(1)[0][0]
-
-    inventory = get_swh_inventory()
-
-    unique_pn = set(item.PN for item in inventory)
 
-    pn_dict = {pn: [] for pn in unique_pn}
+def swh_to_pkg_id(snapshot: Optional[SwhSnapshotStore] = None, estimator_path: str | Path = DEFAULT_SWH_PATH):
+    if snapshot is not None:
+        inventory = InventoryStore.from_snapshot(snapshot.current())
+    else:
+        inventory = InventoryStore.from_items(get_swh_inventory())
 
-    for item in inventory:
-        if item.PKG_ID[:2] in ["XR", "HL"]:
-            continue
-        pn_dict[item.PN].append(item.QTY)
+    # Reels already counted by an earlier run (same PKG_ID) are not counted again
+    estimator = StdPkgEstimator.load(estimator_path)
+    columns = inventory.columns
+    counted = estimator.add(zip(columns["PKG_ID"], columns["PN"], columns["QTY"]))
+    estimator.save(estimator_path)
+    print(f"std_pkg: {counted} new reels, {len(estimator)} PNs")
 
-    for pn, qtys in pn_dict.items():
-        _mc = most_common_number(qtys)
-        if not _mc:
-            continue
-        requests.post(POCKET_BASE_URL, json={"part_number": pn, "std_pkg": _mc})
+    upsert_std_pkg(POCKET_BASE_URL, estimator.as_dict())
 
 
     return None
@@ -1,16 +1,33 @@
-import json
-from datetime import datetime
-from typing import List, Dict, Counter, Optional
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Iterable, List, Dict, Optional
 
 import pandas as pd
-import requests
 from pydantic import BaseModel
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
-from util.wo_details import DeliverMaterialList, MaterialGroup, get_wo_details
+from util.checkpoint import BatchCheckpoint, write_json_atomic
+from util.concurrency import DEFAULT_MAX_WORKERS, UpstreamLimiter, bounded_map
+from util.consumption_store import DEFAULT_DB_PATH, ConsumptionStore
+from util.http_client import DEFAULT_TIMEOUT, get_json
+from util.overstock import assign_overstock, groups_to_frames, overdeliver_summary, overstock_frame, summaries_to_frame
+from util.report_writer import ReportFormat, write_report
+from util.response_cache import CacheMode, ResponseCache, cached_call
+from util.wo_details import (
+    SAP_REQUIREMENT,
+    DeliverItems,
+    DeliverMaterialList,
+    MaterialGroup,
+    build_material_groups_by_wo,
+    build_material_groups_from_details,
+    stream_api,
+)
 
 CONSUMPTION_URL = 'https://emdii-webtool.foxconn-na.com/api/getWO_PKGID?workorder='
+CONSUMPTION_HOST_LIMIT = 6
+SAP_HOST_LIMIT = 4
+CLOSED_AFTER_DAYS = 30
+COLUMNAR_CHUNK_SIZE = 50
 
 
 def parse_created_date(value: str) -> Optional[str]:
@@ -23,36 +40,11 @@ def parse_created_date(value: str) -> Optional[str]:
         return None
 
 
-def call_api(url, *, timeout=10, retries=3, backoff=0.5):
-    session = requests.Session()
-    retry = Retry(
-        total=retries,
-        connect=retries,
-        read=retries,
-        status=retries,
-        backoff_factor=backoff,
-        status_forcelist=(429, 500, 502, 503, 504),
-        allowed_methods=("GET",),
-        raise_on_status=False,
-    )
-    session.mount("http://", HTTPAdapter(max_retries=retry))
-    session.mount("https://", HTTPAdapter(max_retries=retry))
+def call_api(url, *, timeout=DEFAULT_TIMEOUT):
+    return get_json(url, timeout=timeout)
 
-    try:
-        resp = session.get(url, timeout=timeout)
-        resp.raise_for_status()
-        return resp.json()
-    except requests.exceptions.Timeout as e:
-        raise RuntimeError(f"Request timed out after {timeout}s") from e
-    except requests.exceptions.HTTPError as e:
-        raise RuntimeError(f"HTTP error: {e.response.status_code}") from e
-    except requests.exceptions.RequestException as e:
-        raise RuntimeError("Request failed") from e
-    except ValueError as e:
-        raise RuntimeError("Invalid JSON response") from e
-
-
-def summary_delivery(delivery_records: List[Dict[str, str]]) -> dict:
+
+def summary_delivery(delivery_records: Iterable[Dict[str, Any]]) -> dict:
     # Read a json file
 
     # {
@@ -70,17 +62,19 @@ def summary_delivery(delivery_records: List[Dict[str, str]]) -> dict:
     # }
     # Create a report
 
-    _consumptionByPN = {i["HH_PN"]: {"items": [], "qtys": []} for i in delivery_records}
+    # Single pass, so delivery_records can be a stream (stream_api / iter_json_file)
+    _consumptionByPN: Dict[str, DeliverItems] = {}
 
     for i in delivery_records:
-        _consumptionByPN[i["HH_PN"]]["qtys"].append(i["QTY"])
-        _consumptionByPN[i["HH_PN"]]["items"].append(
-            f'{i["CREATED_DATE"]}@{i["EMP_NUMBER"]}@{i["PKG_ID"]}@{i["QTY"]}@{i["LINE_NAME"]}')
+        _items = _consumptionByPN.get(i["HH_PN"])
+        if _items is None:
+            _items = _consumptionByPN[i["HH_PN"]] = DeliverItems()
+        _items.append(i["CREATED_DATE"], i["EMP_NUMBER"], i["PKG_ID"], i["QTY"], i["LINE_NAME"])
 
     _return_summary = {}
     for pn, items in _consumptionByPN.items():
-        _return_summary[pn] = {"reals": len(items["qtys"]), "qty": sum(items["qtys"]), "items": items["items"],
-                               "std_pkg": Counter(items["qtys"]).most_common(1)[0][0]}
+        _return_summary[pn] = {"reals": len(items), "qty": sum(items.qty), "items": items,
+                               "std_pkg": Counter(items.qty).most_common(1)[0][0]}
 
     # print(json.dumps(_return_summary, indent=4))
     # save to file
@@ -183,85 +177,266 @@ def overdeliver_to_excel(material_groups: List[MaterialGroup], headers: tuple[st
     # df = pd.DataFrame(material_groups)
     # df.to_excel("summary.xlsx", index=False)
 
-__total = []
-__report = []
-
-if __name__ == '__main__':
-
-
+def limited_call_api(url: str, limiter: UpstreamLimiter):
+    with limiter.slot(url):
+        return call_api(url)
+
+
+def fetch_wo_payload(
+    wo: str,
+    limiter: UpstreamLimiter,
+    cache: Optional[ResponseCache] = None,
+    closed: bool = False,
+    store: Optional[ConsumptionStore] = None,
+    stream: bool = False,
+) -> tuple[Optional[dict], List[Dict[str, str]]]:
+    """Delivery summary and raw SAP detail rows of one WO; the material groups are built by the caller."""
+    # Closed WOs already in the local warehouse are aggregated in SQL instead of re-downloaded
+    if store is not None and closed and store.has_wo(wo):
+        _summary = store.delivery_summary(wo) or None
+    elif stream:
+        # Records are aggregated while the body downloads; nothing is kept to cache or ingest
+        _url = CONSUMPTION_URL + wo
+        with limiter.slot(_url):
+            _summary = summary_delivery(stream_api(_url))
+    else:
+        _url = CONSUMPTION_URL + wo
+        _responds = cached_call(cache, _url, lambda: limited_call_api(_url, limiter), closed=closed)
+        if store is not None:
+            store.ingest_wo(wo, _responds)
+        _summary = summary_delivery(_responds) if _responds else None
+    if not _summary:
+        return None, []
+
+    _url = SAP_REQUIREMENT + wo
+    if stream:
+        with limiter.slot(_url):
+            return _summary, list(stream_api(_url))
+    _details = cached_call(cache, _url, lambda: limited_call_api(_url, limiter), closed=closed)
+    return _summary, _details or []
+
+
+def materials_list_path(wo: str) -> str:
+    return f"reports/wo_{wo}_materials_list.json"
+
+
+def wo_fingerprint(row) -> dict:
+    return {
+        "line": row['Line'],
+        "platform": row['Platform'],
+        "sku": row['Sku'],
+        "start_date": row['start_date'],
+    }
+
+
+def check_wo(wo: str, summary: Optional[dict], material_groups: List[MaterialGroup]) -> bool:
+    if not summary:
+        print(f"no consumption {wo}")
+        return False
+
+    if not material_groups:
+        print(f"no sap {wo}")
+        return False
+    return True
+
+
+def total_row(row, wo: str, total_overdeliver_components, total_overdeliver_reals) -> dict:
+    return {
+        "line": row['Line'],
+        "platform": row['Platform'],
+        "sku": row['Sku'],
+        "start_date": row['start_date'],
+        "wo": wo,
+        "total_overdeliver_components": total_overdeliver_components,
+        "total_overdeliver_reals": total_overdeliver_reals,
+    }
+
+
+def process_wo(row, wo: str, summary: Optional[dict], material_groups: List[MaterialGroup]) -> Optional[tuple[dict, List[dict]]]:
+    if not check_wo(wo, summary, material_groups):
+        return None
 
-    # Read an Excel file
+    print(f"start {wo}")
+    _handler = MaterialGroupAndDeliversHandler(groups=material_groups)
+    _handler.add_deliver_materials(summary)
+    _handler.overstock_calculation()
+    _handler.calculate_total_consumption()
+    # Save Json
+    write_json_atomic(materials_list_path(wo), _handler.model_dump(mode="json"), separators=(",", ":"))
+
+    _t1, _t2, _data = overdeliver_to_excel(
+        _handler.groups,
+        (row['Line'], row['Platform'], row['Sku']),
+        row['start_date'],
+        wo,
+    )
+    print(f"finish {wo}")
+    return total_row(row, wo, _t1, _t2), _data
+
+
+def process_wos_columnar(
+    batch: Dict[int, tuple],
+) -> Dict[int, tuple[dict, List[dict]]]:
+    """
+    Same results as process_wo for every (row, wo, delivery summary, material groups) in the
+    batch, computed in one columnar pass (util.overstock) instead of per-WO handler loops.
+    """
+    _groups = {wo: groups for _, wo, _, groups in batch.values()}
+    _summaries = {wo: summary for _, wo, summary, _ in batch.values()}
+    _headers = {wo: (row['Line'], row['Platform'], row['Sku'], row['start_date']) for row, wo, _, _ in batch.values()}
+
+    _groups_df, _materials_df = groups_to_frames(_groups)
+    _frame = overstock_frame(_groups_df, _materials_df, summaries_to_frame(_summaries))
+    _overdeliver = overdeliver_summary(_frame, _headers)
+    assign_overstock(_groups, _summaries, _frame)
+
+    _results: Dict[int, tuple[dict, List[dict]]] = {}
+    for idx, (row, wo, _, groups) in batch.items():
+        _handler = MaterialGroupAndDeliversHandler(groups=groups)
+        _handler.calculate_total_consumption()
+        write_json_atomic(materials_list_path(wo), _handler.model_dump(mode="json"), separators=(",", ":"))
 
-    wo_df = pd.read_excel("resources/work_order_list.xlsx")
-    wo_df["start_date"] = pd.to_datetime(wo_df["Start Date"], errors="coerce")
+        _t1, _t2, _data = _overdeliver[wo]
+        _results[idx] = total_row(row, wo, _t1, _t2), _data
+    return _results
 
 
-    for idx, row in wo_df.iterrows():
+def save_checkpoint(checkpoint: BatchCheckpoint, row, wo: str, processed: tuple[dict, List[dict]]):
+    checkpoint.save(
+        wo,
+        wo_fingerprint(row),
+        {"total": processed[0], "report": processed[1]},
+        artifact=materials_list_path(wo),
+    )
 
-        _wo = f"000{row['SAP_WO']}"
 
-        _responds = call_api(CONSUMPTION_URL + _wo)
+def flush_columnar(batch: Dict[int, tuple], checkpoint: BatchCheckpoint, trusted: bool = False) -> Dict[int, tuple[dict, List[dict]]]:
+    """
+    One columnar pass over fetched (row, wo, delivery summary, SAP rows) entries; every
+    processed WO is checkpointed before returning.
+    """
+    _groups = build_material_groups_by_wo({wo: details for _, wo, _, details in batch.values()}, trusted=trusted)
+    batch = {
+        idx: (row, wo, summary, _groups[wo])
+        for idx, (row, wo, summary, _) in batch.items()
+        if check_wo(wo, summary, _groups[wo])
+    }
+    if not batch:
+        return {}
 
-        if not _responds:
-            print(f"no consumption {_wo}")
-            continue
-
-        _summary_deliver = summary_delivery(_responds)
-
-        _material_group_handle = get_wo_details(_wo)
-        if not _material_group_handle:
-            print(f"no sap {_wo}")
-            continue
+    _results = process_wos_columnar(batch)
+    for idx, processed in _results.items():
+        row, wo, _, _ = batch[idx]
+        save_checkpoint(checkpoint, row, wo, processed)
+    return _results
 
 
+__total = []
+__report = []
 
-        print(f"start {_wo}")
-        _handler = MaterialGroupAndDeliversHandler(groups=_material_group_handle)
-        _handler.add_deliver_materials(_summary_deliver)
-        _handler.overstock_calculation()
-        _handler.calculate_total_consumption()
-        # Save Json
-        with open(f"reports/wo_{_wo}_materials_list.json", "w") as f:
-            json.dump(_handler.model_dump(), f, indent=4)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Overdelivery report for the work orders in resources/work_order_list.xlsx")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="size of the fetch pool")
+    parser.add_argument("--consumption-limit", type=int, default=CONSUMPTION_HOST_LIMIT,
+                        help="max concurrent requests to the consumption endpoint")
+    parser.add_argument("--sap-limit", type=int, default=SAP_HOST_LIMIT,
+                        help="max concurrent requests to the SAP detail endpoint")
+    parser.add_argument("--refresh", action="store_true",
+                        help="re-download every payload and overwrite the response cache")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the response cache")
+    parser.add_argument("--fresh", action="store_true",
+                        help="ignore checkpoints of a previous run and process every WO again")
+    parser.add_argument("--engine", choices=("handler", "columnar"), default="handler",
+                        help="columnar computes the overstock of the fetched WOs in one pass per chunk")
+    parser.add_argument("--chunk-size", type=int, default=COLUMNAR_CHUNK_SIZE,
+                        help="WOs per columnar pass; each pass is checkpointed before the next one starts")
+    parser.add_argument("--warehouse", nargs="?", const=str(DEFAULT_DB_PATH), default=None,
+                        help="read closed WOs from / ingest fetched WOs into the local DuckDB consumption warehouse")
+    parser.add_argument("--stream", action="store_true",
+                        help="parse payloads record by record while they download (bypasses the response cache)")
+    parser.add_argument("--format", choices=[f.value for f in ReportFormat], default=ReportFormat.XLSX.value,
+                        help="output format of summary/totals (parquet/csv for machine consumers)")
+    parser.add_argument("--closed-after-days", type=int, default=CLOSED_AFTER_DAYS,
+                        help="WOs that started more than this many days ago are cached permanently")
+    parser.add_argument("--trusted", action="store_true",
+                        help="build the material groups without re-validating the SAP rows (faster on big batches)")
+    args = parser.parse_args()
 
-        # for item in _handler.get_overstock_groups():
-        #     print(json.dumps(item.model_dump(), indent=4))
+    # Read an Excel file
 
+    wo_df = pd.read_excel("resources/work_order_list.xlsx")
+    wo_df["start_date"] = pd.to_datetime(wo_df["Start Date"], errors="coerce")
 
+    _rows = [row for _, row in wo_df.iterrows()]
+    _wos = [f"000{row['SAP_WO']}" for row in _rows]
 
-        _t1, _t2, _data = overdeliver_to_excel(
-            _handler.groups,
-            (row['Line'], row['Platform'], row['Sku']),
-            row['start_date'],
-            _wo,
+    _cache = ResponseCache(
+        mode=CacheMode.BYPASS if args.no_cache else CacheMode.REFRESH if args.refresh else CacheMode.USE
+    )
+    _closed_before = pd.Timestamp.now() - timedelta(days=int(args.closed_after_days))
+    _closed = {
+        wo: bool(pd.notna(row['start_date']) and row['start_date'] < _closed_before)
+        for wo, row in zip(_wos, _rows)
+    }
+
+    _store = ConsumptionStore(args.warehouse) if args.warehouse else None
+
+    _limiter = UpstreamLimiter({
+        CONSUMPTION_URL: args.consumption_limit,
+        SAP_REQUIREMENT: args.sap_limit,
+    })
+
+    # Results are processed as they arrive and re-assembled in the worksheet order at the end
+    _results: Dict[int, tuple[dict, List[dict]]] = {}
+    _checkpoint = BatchCheckpoint(max_age_seconds=_cache.ttl_seconds)
+
+    _batch: Dict[int, tuple] = {}
+    _pending: List[int] = []
+    for idx, (_wo, row) in enumerate(zip(_wos, _rows)):
+        _saved = None if args.fresh else _checkpoint.load(
+            _wo, wo_fingerprint(row), artifact=materials_list_path(_wo), closed=_closed[_wo]
         )
+        if _saved is None:
+            _pending.append(idx)
+        else:
+            _results[idx] = _saved["total"], _saved["report"]
+    if len(_pending) < len(_wos):
+        print(f"resuming: {len(_wos) - len(_pending)} WOs already current, {len(_pending)} to process")
+
+    for result in bounded_map(
+            lambda idx: fetch_wo_payload(_wos[idx], _limiter, _cache, _closed[_wos[idx]], _store, args.stream),
+            _pending, max_workers=args.workers):
+        _idx, _wo = result.item, _wos[result.item]
+        if not result.ok:
+            print(f"failed {_wo}: {result.error}")
+            continue
+        _summary, _details = result.value
+        if args.engine == "columnar":
+            _batch[_idx] = _rows[_idx], _wo, _summary, _details
+            if len(_batch) >= args.chunk_size:
+                # Checkpointed per chunk, so an interrupted run only repeats the open chunk
+                _results.update(flush_columnar(_batch, _checkpoint, args.trusted))
+                _batch = {}
+            continue
+        _processed = process_wo(_rows[_idx], _wo, _summary, build_material_groups_from_details(_details, trusted=args.trusted))
+        if _processed is not None:
+            _results[_idx] = _processed
+            save_checkpoint(_checkpoint, _rows[_idx], _wo, _processed)
+
+    if _batch:
+        _results.update(flush_columnar(_batch, _checkpoint, args.trusted))
 
-        __total.append({
-            "line": row['Line'],
-            "platform": row['Platform'],
-            "sku": row['Sku'],
-            "start_date": row['start_date'],
-            "wo": _wo,
-            "total_overdeliver_components": _t1,
-            "total_overdeliver_reals": _t2,
-        })
+    if _store is not None:
+        _store.close()
 
+    for idx in sorted(_results):
+        _t, _data = _results[idx]
+        __total.append(_t)
         for item in _data:
             __report.append(item)
 
-        print(f"finish {_wo}")
-
-
-
     # Create Excel Report
-    df = pd.DataFrame(__report)
-    with pd.ExcelWriter("reports/summary.xlsx", engine="openpyxl",
-                        datetime_format="yyyy-mm-dd hh:mm:ss") as writer:
-        df.to_excel(writer, index=False)
+    write_report(__report, "reports/summary.xlsx", args.format)
 
     # Create Excel Report
-    df = pd.DataFrame(__total)
-    with pd.ExcelWriter("reports/totals.xlsx", engine="openpyxl",
-                        datetime_format="yyyy-mm-dd hh:mm:ss") as writer:
-        df.to_excel(writer, index=False)
-
+    write_report(__total, "reports/totals.xlsx", args.format)
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from util.checkpoint import write_json_atomic
+from util.model_ingest import build
+from util.response_cache import ResponseCache
+from util.wo_details import Material, MaterialGroup, build_material_groups_from_details, get_wo_detail_rows
+
+DEFAULT_TEMPLATE_DIR = Path("cache") / "bom_templates"
+DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_VERIFY_WORKERS = 2
+
+
+def template_from_groups(sku: str, version: str, wo: str, groups: List[MaterialGroup]) -> Dict[str, Any]:
+    # The WO's unit count is the most common header request qty, as in build_material_groups_from_details
+    units = Counter(group.request_qty for group in groups).most_common(1)[0][0] or 1
+    return {
+        "sku": sku,
+        "version": version,
+        "source_wo": wo,
+        "units": units,
+        "stored_at": time.time(),
+        "groups": [
+            {
+                "high_level_pn": group.high_level_pn,
+                "request_qty": group.request_qty,
+                "consumption_qty": group.consumption_qty,
+                "sku": group.sku,
+                "materials": [material.model_dump() for material in group.materials],
+            }
+            for group in groups
+        ],
+    }
+
+
+def scale_template(template: Dict[str, Any], wo: str, units: int) -> List[MaterialGroup]:
+    """
+    Material groups of a WO of the template's SKU/version for the given units: the structure
+    and per-unit consumption are the template's, request quantities (attrition included) are
+    the source WO's scaled by units / source units. Templates hold validated models, so the
+    scaled ones are built without validating again.
+    """
+    factor = units / template["units"]
+    groups: List[MaterialGroup] = []
+    for item in template["groups"]:
+        materials = [
+            build(Material, True, **{**material, "request_qty": round(material["request_qty"] * factor)})
+            for material in item["materials"]
+        ]
+        request_qty = round(item["request_qty"] * factor)
+        total_consumption = sum(material.request_qty for material in materials)
+        groups.append(
+            build(
+                MaterialGroup,
+                True,
+                high_level_pn=item["high_level_pn"],
+                primary_pn=next((m.part_number for m in reversed(materials) if m.is_primary), "nan"),
+                request_qty=request_qty,
+                attrition=total_consumption - request_qty,
+                total_consumption=total_consumption,
+                consumption_qty=item["consumption_qty"],
+                sku=item["sku"],
+                wo=wo,
+                materials=materials,
+                list_materials_str=[material.part_number for material in materials],
+            )
+        )
+    return groups
+
+
+def structure(groups: List[MaterialGroup]) -> Tuple:
+    """What a template promises about a WO: groups, per-unit consumption and alternates."""
+    return tuple(
+        (group.high_level_pn, group.consumption_qty, tuple((m.part_number, m.is_primary) for m in group.materials))
+        for group in groups
+    )
+
+
+class BomTemplateCache:
+    """
+    Per SKU/version material-group templates, so only the first WO of a SKU is downloaded
+    from SAP and the others are scaled from it. Templates are kept in memory and as JSON
+    files under directory, and are rebuilt from SAP once older than max_age_seconds.
+
+    With verify=True a scaled WO is also fetched from SAP on a small background pool; if
+    its structure differs the template is replaced and the WO is reported by
+    wait_verified() together with its real groups. Use it as a context manager, or call
+    close(), to shut the verification pool down.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path = DEFAULT_TEMPLATE_DIR,
+        *,
+        max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+        cache: Optional[ResponseCache] = None,
+        verify_workers: int = DEFAULT_VERIFY_WORKERS,
+    ):
+        self.directory = Path(directory)
+        self.max_age_seconds = max_age_seconds
+        self.cache = cache
+        self.verify_workers = verify_workers
+        self._templates: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: List[Tuple[str, Future]] = []
+        self._mismatches: Dict[str, List[MaterialGroup]] = {}
+
+    def _path(self, sku: str, version: str) -> Path:
+        return self.directory / f"{sku}_{version or 'none'}.json"
+
+    def _key_lock(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def load(self, sku: str, version: str) -> Optional[Dict[str, Any]]:
+        key = (sku, version)
+        template = self._templates.get(key)
+        if template is None:
+            try:
+                with self._path(sku, version).open("r", encoding="utf-8") as f:
+                    template = json.load(f)
+            except (FileNotFoundError, ValueError):
+                return None
+        if time.time() - template["stored_at"] > self.max_age_seconds:
+            self._templates.pop(key, None)
+            return None
+        self._templates[key] = template
+        return template
+
+    def store(self, sku: str, version: str, wo: str, groups: List[MaterialGroup]) -> Dict[str, Any]:
+        template = template_from_groups(sku, version, wo, groups)
+        write_json_atomic(self._path(sku, version), template, separators=(",", ":"))
+        self._templates[(sku, version)] = template
+        return template
+
+    def _fetch(self, wo: str, trusted: bool) -> List[MaterialGroup]:
+        return build_material_groups_from_details(get_wo_detail_rows(wo, cache=self.cache), trusted=trusted)
+
+    def get_wo_details(
+        self,
+        wo: str,
+        sku: str,
+        version: str,
+        units: int,
+        *,
+        trusted: bool = False,
+        verify: bool = False,
+    ) -> List[MaterialGroup]:
+        key = (sku, version)
+        # One download per SKU/version even when WOs of the same SKU are resolved concurrently
+        with self._key_lock(key):
+            template = self.load(sku, version)
+            if template is None:
+                groups = self._fetch(wo, trusted)
+                if groups:
+                    self.store(sku, version, wo, groups)
+                return groups
+
+        if verify and wo != template["source_wo"]:
+            self._submit_verify(key, wo, units, trusted)
+        return scale_template(template, wo, units)
+
+    def _submit_verify(self, key: Tuple[str, str], wo: str, units: int, trusted: bool) -> None:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.verify_workers, thread_name_prefix="bom-verify")
+            self._pending.append((wo, self._executor.submit(self._verify, key, wo, units, trusted)))
+
+    def _verify(self, key: Tuple[str, str], wo: str, units: int, trusted: bool) -> None:
+        groups = self._fetch(wo, trusted)
+        if not groups:
+            return
+        template = self._templates.get(key)
+        if template is not None and structure(groups) == structure(scale_template(template, wo, units)):
+            return
+        self.store(*key, wo, groups)
+        with self._lock:
+            self._mismatches[wo] = groups
+
+    def wait_verified(self) -> Dict[str, List[MaterialGroup]]:
+        """
+        Block until the background verifications finish; returns {wo: real groups} of the
+        WOs whose scaled template did not match SAP. Verification is best effort: a WO whose
+        SAP fetch failed is reported and keeps its scaled groups.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        wait([future for _, future in pending])
+        for wo, future in pending:
+            error = future.exception()
+            if error is not None:
+                print(f"verify {wo} failed: {error}")
+        with self._lock:
+            mismatches, self._mismatches = self._mismatches, {}
+        return mismatches
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self) -> "BomTemplateCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
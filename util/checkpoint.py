@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import json
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from util.atomic_write import write_atomic
+
+DEFAULT_CHECKPOINT_DIR = Path("reports") / "checkpoints"
+DEFAULT_MAX_AGE_SECONDS = 6 * 60 * 60
+
+
+def _encode(value: Any):
+    if isinstance(value, (datetime, date)):
+        return {"__datetime__": None if pd.isna(value) else value.isoformat()}
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode(obj: Dict[str, Any]):
+    if obj.keys() == {"__datetime__"}:
+        return pd.NaT if obj["__datetime__"] is None else pd.Timestamp(obj["__datetime__"])
+    return obj
+
+
+def write_json_atomic(path: str | Path, data: Any, **kwargs) -> None:
+    def write(tmp: Path) -> None:
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(data, f, default=_encode, **kwargs)
+
+    write_atomic(path, write)
+
+
+class BatchCheckpoint:
+    """
+    Per-WO results of a batch run, persisted as each WO completes so an interrupted
+    run can be resumed. A checkpoint is current when its fingerprint still matches the
+    input row, the materials list it was computed with is unchanged on disk and, for
+    open WOs, it is younger than max_age_seconds.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path = DEFAULT_CHECKPOINT_DIR,
+        *,
+        max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+    ):
+        self.directory = Path(directory)
+        self.max_age_seconds = max_age_seconds
+
+    def _path(self, wo: str) -> Path:
+        return self.directory / f"wo_{wo}.json"
+
+    @staticmethod
+    def _mtime_ns(path: Optional[str | Path]) -> Optional[int]:
+        if path is None:
+            return None
+        try:
+            return Path(path).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def load(
+        self,
+        wo: str,
+        fingerprint: Dict[str, Any],
+        *,
+        artifact: Optional[str | Path] = None,
+        closed: bool = False,
+    ) -> Optional[Dict[str, Any]]:
+        try:
+            with self._path(wo).open("r", encoding="utf-8") as f:
+                entry = json.load(f, object_hook=_decode)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if json.dumps(entry.get("fingerprint"), default=_encode) != json.dumps(fingerprint, default=_encode):
+            return None
+        if artifact is not None:
+            mtime = self._mtime_ns(artifact)
+            if mtime is None or mtime != entry.get("artifact_mtime_ns"):
+                return None
+        if not closed and time.time() - entry.get("saved_at", 0) > self.max_age_seconds:
+            return None
+        return entry.get("result")
+
+    def save(
+        self,
+        wo: str,
+        fingerprint: Dict[str, Any],
+        result: Dict[str, Any],
+        *,
+        artifact: Optional[str | Path] = None,
+    ) -> None:
+        write_json_atomic(
+            self._path(wo),
+            {
+                "wo": wo,
+                "saved_at": time.time(),
+                "fingerprint": fingerprint,
+                "artifact_mtime_ns": self._mtime_ns(artifact),
+                "result": result,
+            },
+        )
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Generic, Iterable, Iterator, List, Optional, TypeVar
+from urllib.parse import urlsplit
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_HOST_LIMIT = 4
+
+
+class UpstreamLimiter:
+    """
+    Caps the number of in-flight requests per upstream endpoint. Limits are keyed by
+    URL prefix (e.g. the consumption and SAP detail endpoints share a host but get
+    separate caps); URLs matching no prefix are capped per host with the default.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, default: int = DEFAULT_HOST_LIMIT):
+        self._limits = dict(limits or {})
+        self._prefixes = sorted(self._limits, key=len, reverse=True)
+        self._default = default
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, url: str) -> str:
+        for prefix in self._prefixes:
+            if url.startswith(prefix):
+                return prefix
+        return urlsplit(url).netloc
+
+    def _semaphore(self, key: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._semaphores.get(key)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self._limits.get(key, self._default))
+                self._semaphores[key] = semaphore
+            return semaphore
+
+    @contextmanager
+    def slot(self, url: str):
+        with self._semaphore(self._key(url)):
+            yield
+
+
+@dataclass
+class TaskResult(Generic[T, R]):
+    index: int
+    item: T
+    value: Optional[R] = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def bounded_map(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    *,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> Iterator[TaskResult[T, R]]:
+    """
+    Run func over items in a bounded thread pool and yield results as they complete.
+    Exceptions are captured per item so one failure does not abort the batch; use
+    TaskResult.index to restore input order.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as pool:
+        futures: Dict[Any, int] = {pool.submit(func, item): idx for idx, item in enumerate(items)}
+        for future in as_completed(futures):
+            idx = futures[future]
+            try:
+                yield TaskResult(index=idx, item=items[idx], value=future.result())
+            except Exception as e:
+                yield TaskResult(index=idx, item=items[idx], error=e)
+
+
+async def bounded_gather(
+    func: Callable[[T], Awaitable[R]],
+    items: Iterable[T],
+    *,
+    limit: int = DEFAULT_MAX_WORKERS,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> List[TaskResult[T, R]]:
+    """
+    asyncio counterpart of bounded_map: await func over items with at most limit in
+    flight, capturing exceptions per item. Results come back in input order; progress,
+    if given, is called with (done, total) as each item finishes.
+    """
+    items = list(items)
+    semaphore = asyncio.Semaphore(max(1, limit))
+    done = 0
+
+    async def run(idx: int, item: T) -> TaskResult[T, R]:
+        nonlocal done
+        async with semaphore:
+            try:
+                result = TaskResult(index=idx, item=item, value=await func(item))
+            except Exception as e:
+                result = TaskResult(index=idx, item=item, error=e)
+        done += 1
+        if progress is not None:
+            progress(done, len(items))
+        return result
+
+    return list(await asyncio.gather(*(run(idx, item) for idx, item in enumerate(items))))
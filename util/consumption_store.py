@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import threading
+from datetime import timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import duckdb
+import pandas as pd
+
+from util.wo_details import DeliverItems
+
+DEFAULT_DB_PATH = Path("cache") / "consumption.duckdb"
+
+# DFMS getWO_PKGID format, e.g. "Thu, 18 Dec 2025 11:55:42 GMT"
+CREATED_DATE_FORMAT = "%a, %d %b %Y %H:%M:%S GMT"
+
+RECORD_COLUMNS = (
+    "CREATED_DATE", "EMP_NUMBER", "HH_PN", "LINE_NAME", "MFR_PN", "PKG_ID", "QTY", "REMAIN_QTY", "REMARKS", "WO",
+    "rowNum",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS consumption (
+    ROW_ORDER BIGINT NOT NULL,
+    WO VARCHAR NOT NULL,
+    HH_PN VARCHAR NOT NULL,
+    PKG_ID VARCHAR,
+    QTY INTEGER,
+    CREATED_DATE TIMESTAMP,
+    EMP_NUMBER VARCHAR,
+    LINE_NAME VARCHAR,
+    REMARKS VARCHAR,
+    MFR_PN VARCHAR,
+    REMAIN_QTY INTEGER,
+    rowNum BIGINT
+);
+-- Warehouses created before these columns were stored
+ALTER TABLE consumption ADD COLUMN IF NOT EXISTS MFR_PN VARCHAR;
+ALTER TABLE consumption ADD COLUMN IF NOT EXISTS REMAIN_QTY INTEGER;
+ALTER TABLE consumption ADD COLUMN IF NOT EXISTS rowNum BIGINT;
+CREATE TABLE IF NOT EXISTS ingested_wo (
+    WO VARCHAR PRIMARY KEY,
+    ROWS BIGINT NOT NULL,
+    INGESTED_AT TIMESTAMP NOT NULL
+);
+"""
+
+
+class ConsumptionStore:
+    """
+    Local DuckDB warehouse of DFMS consumption (getWO_PKGID) records.
+
+    Records are stored typed (CREATED_DATE as TIMESTAMP, QTY as INTEGER) together with
+    their source order, so per-PN/per-WO aggregates can be answered in SQL with the same
+    results as the Python aggregations in run_utils/main.
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_DB_PATH, *, read_only: bool = False):
+        self.path = Path(path)
+        if not read_only:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._con = duckdb.connect(str(self.path), read_only=read_only)
+        self._write_lock = threading.Lock()
+        if not read_only:
+            self._con.execute(SCHEMA)
+
+    def __enter__(self) -> "ConsumptionStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._con.close()
+
+    def _cursor(self) -> duckdb.DuckDBPyConnection:
+        # One cursor per call so the store can be shared by the batch worker threads
+        return self._con.cursor()
+
+    # Ingest
+
+    def ingest(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Load raw getWO_PKGID records, replacing everything previously stored for their WOs."""
+        df = pd.DataFrame(list(records), columns=list(RECORD_COLUMNS))
+        if df.empty:
+            return 0
+        df["WO"] = df["WO"].astype(str)
+
+        with self._write_lock:
+            return self._insert(df)
+
+    def _insert(self, df: pd.DataFrame) -> int:
+        cur = self._cursor()
+        cur.execute("BEGIN TRANSACTION")
+        try:
+            base = cur.execute("SELECT coalesce(max(ROW_ORDER), -1) + 1 FROM consumption").fetchone()[0]
+            df.insert(0, "ROW_ORDER", range(base, base + len(df)))
+            cur.register("incoming", df)
+            cur.execute("DELETE FROM consumption WHERE WO IN (SELECT DISTINCT WO FROM incoming)")
+            cur.execute(
+                f"""
+                INSERT INTO consumption
+                SELECT ROW_ORDER, WO, HH_PN, PKG_ID, CAST(QTY AS INTEGER),
+                       try_strptime(CREATED_DATE, '{CREATED_DATE_FORMAT}'),
+                       CAST(EMP_NUMBER AS VARCHAR), LINE_NAME, REMARKS,
+                       CAST(MFR_PN AS VARCHAR), TRY_CAST(REMAIN_QTY AS INTEGER), TRY_CAST(rowNum AS BIGINT)
+                FROM incoming
+                """
+            )
+            cur.execute(
+                """
+                INSERT OR REPLACE INTO ingested_wo
+                SELECT WO, count(*), now() FROM incoming GROUP BY WO
+                """
+            )
+            cur.unregister("incoming")
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        return len(df)
+
+    def ingest_wo(self, wo: str, records: Optional[List[Dict[str, Any]]]) -> int:
+        """Like ingest, but also records a WO that has no consumption yet."""
+        if records:
+            return self.ingest(records)
+        with self._write_lock:
+            cur = self._cursor()
+            cur.execute("DELETE FROM consumption WHERE WO = ?", [wo])
+            cur.execute("INSERT OR REPLACE INTO ingested_wo VALUES (?, 0, now())", [wo])
+        return 0
+
+    # Queries
+
+    def has_wo(self, wo: str) -> bool:
+        return self._cursor().execute("SELECT 1 FROM ingested_wo WHERE WO = ?", [wo]).fetchone() is not None
+
+    def wos(self) -> List[str]:
+        return [row[0] for row in self._cursor().execute("SELECT WO FROM ingested_wo ORDER BY WO").fetchall()]
+
+    def std_pkg(
+        self,
+        *,
+        wo: Optional[str] = None,
+        exclude_prefixes: Sequence[str] = (),
+    ) -> Dict[str, int]:
+        """
+        Most common QTY per HH_PN. Ties resolve to the qty seen first, which matches
+        Counter(...).most_common(1) over the records in source order.
+        """
+        conditions, params = [], []
+        if wo:
+            conditions.append("WO = ?")
+            params.append(wo)
+        for prefix in exclude_prefixes:
+            conditions.append("NOT starts_with(coalesce(PKG_ID, ''), ?)")
+            params.append(prefix)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        rows = self._cursor().execute(
+            f"""
+            SELECT HH_PN, QTY FROM (
+                SELECT HH_PN, QTY, count(*) AS cnt, min(ROW_ORDER) AS first_seen
+                FROM consumption {where}
+                GROUP BY HH_PN, QTY
+            )
+            QUALIFY row_number() OVER (PARTITION BY HH_PN ORDER BY cnt DESC, first_seen) = 1
+            """,
+            params,
+        ).fetchall()
+        return {pn: qty for pn, qty in rows}
+
+    def delivery_summary(self, wo: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Same result as run_utils.summary_delivery(records of wo, or of every WO), computed in SQL."""
+        std_pkg = self.std_pkg(wo=wo)
+        where, params = ("WHERE WO = ?", [wo]) if wo else ("", [])
+        rows = self._cursor().execute(
+            f"""
+            SELECT HH_PN, count(*) AS reals, CAST(sum(QTY) AS BIGINT) AS qty,
+                   list(CREATED_DATE ORDER BY ROW_ORDER), list(EMP_NUMBER ORDER BY ROW_ORDER),
+                   list(PKG_ID ORDER BY ROW_ORDER), list(QTY ORDER BY ROW_ORDER), list(LINE_NAME ORDER BY ROW_ORDER)
+            FROM consumption {where}
+            GROUP BY HH_PN
+            ORDER BY min(ROW_ORDER)
+            """,
+            params,
+        ).fetchall()
+        return {
+            pn: {
+                "reals": reals,
+                "qty": qty,
+                "items": DeliverItems.model_construct(
+                    created_date=[None if date is None else date.replace(tzinfo=timezone.utc) for date in dates],
+                    emp_number=emps,
+                    pkg_id=pkgs,
+                    qty=qtys,
+                    line_name=lines,
+                ),
+                "std_pkg": std_pkg[pn],
+            }
+            for pn, reals, qty, dates, emps, pkgs, qtys, lines in rows
+        }
+
+    def pn_packages(self, wo: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Same rows main.summary_delivery writes to summary_consumption.json, computed in SQL,
+        for one WO or the whole warehouse.
+        """
+        std_pkg = self.std_pkg(wo=wo)
+        where, params = ("WHERE WO = ?", [wo]) if wo else ("", [])
+        rows = self._cursor().execute(
+            f"""
+            SELECT HH_PN, count(*) AS reals, CAST(sum(QTY) AS BIGINT) AS qty, list(PKG_ID ORDER BY ROW_ORDER) AS pkgs
+            FROM consumption {where}
+            GROUP BY HH_PN
+            ORDER BY min(ROW_ORDER)
+            """,
+            params,
+        ).fetchall()
+        return [
+            {"pn": pn, "reals": reals, "qty": qty, "pkgs": pkgs, "std_pkg": std_pkg[pn]}
+            for pn, reals, qty, pkgs in rows
+        ]
+
+    def find_pn(self, pns: Sequence[str], wo: Optional[str] = None) -> pd.DataFrame:
+        """Every delivered reel of the given part numbers, oldest first, with the getWO_PKGID columns."""
+        where, params = "WHERE list_contains(?, HH_PN)", [list(pns)]
+        if wo:
+            where += " AND WO = ?"
+            params.append(wo)
+        return self._cursor().execute(
+            f"""
+            SELECT CREATED_DATE, EMP_NUMBER, HH_PN, LINE_NAME, MFR_PN, PKG_ID, QTY, REMAIN_QTY, REMARKS, WO, rowNum
+            FROM consumption {where}
+            ORDER BY CREATED_DATE, ROW_ORDER
+            """,
+            params,
+        ).df()
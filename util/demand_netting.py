@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from util.wo_details import MaterialGroup
+
+
+class DemandMatrix:
+    """
+    Pending consumption as a sparse (part number x MO) matrix in coordinate form: entry k
+    is qty[k] of pns[rows[k]] still to be consumed by mos[cols[k]]. Each group's
+    pending_consumption is split over its materials pro rata by request_qty, as
+    apply_pending_consumption always did. Entries are sorted by part number so one PN's
+    demand is a contiguous slice (indptr[i]:indptr[i + 1]).
+    """
+
+    def __init__(self, pns: List[str], mos: List[str], rows: np.ndarray, cols: np.ndarray, qty: np.ndarray):
+        order = np.lexsort((cols, rows))
+        self.pns = pns
+        self.mos = mos
+        self.rows = rows[order]
+        self.cols = cols[order]
+        self.qty = qty[order]
+        self.indptr = np.searchsorted(self.rows, np.arange(len(pns) + 1))
+        self._pn_index = {pn: idx for idx, pn in enumerate(pns)}
+
+    @classmethod
+    def from_groups(cls, wo_list: Mapping[str, List[MaterialGroup]]) -> DemandMatrix:
+        pn_index: Dict[str, int] = {}
+        mos = list(wo_list)
+        rows: List[int] = []
+        cols: List[int] = []
+        pending: List[float] = []
+        material_qty: List[float] = []
+        group_qty: List[float] = []
+
+        for col, groups in enumerate(wo_list.values()):
+            for group in groups:
+                if group.pending_consumption == 0 or group.request_qty <= 0:
+                    continue
+                for material in group.materials:
+                    if material.request_qty > 0:
+                        rows.append(pn_index.setdefault(material.part_number, len(pn_index)))
+                        cols.append(col)
+                        pending.append(group.pending_consumption)
+                        material_qty.append(material.request_qty)
+                        group_qty.append(group.request_qty)
+
+        qty = np.asarray(pending, dtype=float) * (
+            np.asarray(material_qty, dtype=float) / np.asarray(group_qty, dtype=float)
+        )
+        return cls(list(pn_index), mos, np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64), qty)
+
+    @classmethod
+    def per_unit(cls, wo_list: Mapping[str, List[MaterialGroup]]) -> DemandMatrix:
+        """
+        Demand of one more unit of each MO (consumption_qty split the same way), whatever
+        is left to build: the matrix times a vector of pending units per MO is the demand.
+        """
+        pn_index: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        qty: List[float] = []
+
+        for col, groups in enumerate(wo_list.values()):
+            for group in groups:
+                if group.consumption_qty == 0 or group.request_qty <= 0:
+                    continue
+                for material in group.materials:
+                    if material.request_qty > 0:
+                        rows.append(pn_index.setdefault(material.part_number, len(pn_index)))
+                        cols.append(col)
+                        qty.append(group.consumption_qty * (material.request_qty / group.request_qty))
+
+        return cls(list(pn_index), list(wo_list), np.asarray(rows, dtype=np.int64),
+                   np.asarray(cols, dtype=np.int64), np.asarray(qty, dtype=float))
+
+    def __len__(self) -> int:
+        return len(self.qty)
+
+    def demand(self) -> np.ndarray:
+        """Total pending demand per part number, aligned with pns."""
+        return np.bincount(self.rows, weights=self.qty, minlength=len(self.pns))
+
+    def row(self, pn: str) -> Optional[int]:
+        return self._pn_index.get(pn)
+
+    def by_mo(self, pn: str) -> Dict[str, float]:
+        """{mo: pending qty} of one part number."""
+        idx = self._pn_index.get(pn)
+        if idx is None:
+            return {}
+        start, end = self.indptr[idx], self.indptr[idx + 1]
+        contribution: Dict[str, float] = {}
+        for col, qty in zip(self.cols[start:end].tolist(), self.qty[start:end].tolist()):
+            mo = self.mos[col]
+            contribution[mo] = contribution.get(mo, 0) + qty
+        return contribution
+
+    def dense(self) -> np.ndarray:
+        """The len(pns) x len(mos) array."""
+        array = np.zeros((len(self.pns), len(self.mos)))
+        np.add.at(array, (self.rows, self.cols), self.qty)
+        return array
+
+    def by_line(self, lines: Mapping[str, str]) -> Tuple[List[str], np.ndarray]:
+        """
+        Demand per (part number, production line) given {mo: line}: the line names and a
+        dense len(pns) x len(lines) array. MOs missing from lines are left out.
+        """
+        line_names = list(dict.fromkeys(lines[mo] for mo in self.mos if mo in lines))
+        line_index = {line: idx for idx, line in enumerate(line_names)}
+        mo_line = np.array([line_index.get(lines.get(mo), -1) for mo in self.mos], dtype=np.int64)
+
+        entry_line = mo_line[self.cols] if len(self.cols) else np.empty(0, dtype=np.int64)
+        keep = entry_line >= 0
+        flat = self.rows[keep] * len(line_names) + entry_line[keep]
+        counts = np.bincount(flat, weights=self.qty[keep], minlength=len(self.pns) * len(line_names))
+        return line_names, counts.reshape(len(self.pns), len(line_names))
+
+    def net(self, inventory: Mapping[str, float], lines: Optional[Mapping[str, str]] = None) -> NettingResult:
+        return NettingResult(self, inventory, lines)
+
+
+class NettingResult:
+    """
+    Inventory minus pending demand over every part number in either. pns lists the
+    inventory's part numbers first, then the ones only demanded, in the order the dict
+    version of the netting produced them.
+    """
+
+    def __init__(self, matrix: DemandMatrix, inventory: Mapping[str, float], lines: Optional[Mapping[str, str]] = None):
+        self.matrix = matrix
+        self.pns = list(inventory)
+        index = {pn: idx for idx, pn in enumerate(self.pns)}
+        for pn in matrix.pns:
+            if pn not in index:
+                index[pn] = len(self.pns)
+                self.pns.append(pn)
+        self._index = index
+
+        # Row i of the matrix is position demand_pos[i] of the result
+        self._demand_pos = np.array([index[pn] for pn in matrix.pns], dtype=np.int64)
+        self.stock = np.zeros(len(self.pns))
+        self.stock[: len(inventory)] = np.fromiter(inventory.values(), dtype=float, count=len(inventory))
+        self.demand = np.zeros(len(self.pns))
+        self.demand[self._demand_pos] = matrix.demand()
+        self.net = self.stock - self.demand
+        self._lines = lines
+        self._line_demand: Optional[Tuple[List[str], np.ndarray]] = None
+
+    def as_dict(self) -> Dict[str, float]:
+        """{pn: net qty}: what apply_pending_consumption returns."""
+        return dict(zip(self.pns, self.net.tolist()))
+
+    def shortfall(self) -> Dict[str, float]:
+        """{pn: missing qty} of the part numbers whose demand exceeds the stock."""
+        short = np.flatnonzero(self.net < 0)
+        return {self.pns[idx]: qty for idx, qty in zip(short.tolist(), (-self.net[short]).tolist())}
+
+    def top_shortages(self, n: int = 20) -> List[Tuple[str, float]]:
+        """The n largest shortfalls, largest first."""
+        if n <= 0:
+            return []
+        short = np.flatnonzero(self.net < 0)
+        if len(short) > n:
+            short = short[np.argpartition(self.net[short], n - 1)[:n]]
+        short = short[np.argsort(self.net[short], kind="stable")]
+        return [(self.pns[idx], -float(self.net[idx])) for idx in short.tolist()]
+
+    def by_mo(self, pn: str) -> Dict[str, float]:
+        return self.matrix.by_mo(pn)
+
+    def _by_line(self) -> Tuple[List[str], np.ndarray]:
+        if self._lines is None:
+            raise ValueError("netting was run without a {mo: line} map")
+        if self._line_demand is None:
+            self._line_demand = self.matrix.by_line(self._lines)
+        return self._line_demand
+
+    def by_line(self, pn: str) -> Dict[str, float]:
+        """{line: pending qty} of one part number. Needs the {mo: line} map given to net()."""
+        line_names, demand = self._by_line()
+        row = self.matrix.row(pn)
+        if row is None:
+            return {}
+        return {line: qty for line, qty in zip(line_names, demand[row].tolist()) if qty}
+
+    def line_demand(self) -> Dict[str, Dict[str, float]]:
+        """{line: {pn: pending qty}} over every part number."""
+        line_names, demand = self._by_line()
+        return {
+            line: {self.matrix.pns[row]: float(demand[row, col]) for row in np.flatnonzero(demand[:, col]).tolist()}
+            for col, line in enumerate(line_names)
+        }
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_TIMEOUT_SECONDS = 10 * 60
+POLL_SECONDS = 0.2
+
+
+class FileLockTimeout(RuntimeError):
+    pass
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """
+    Cross-process lock held as an OS lock on a lockfile (flock on POSIX, msvcrt.locking
+    on Windows). The OS releases it when the holder exits or crashes, so there is no stale
+    lockfile to break. The lockfile itself is left in place: removing it would let two
+    processes lock two different files under the same name.
+    """
+
+    def __init__(self, path: str | Path, *, timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS):
+        self.path = Path(path)
+        self.timeout_seconds = timeout_seconds
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+        deadline = time.monotonic() + self.timeout_seconds
+        while not _try_lock(fd):
+            if time.monotonic() > deadline:
+                os.close(fd)
+                raise FileLockTimeout(f"Timed out waiting for {self.path}")
+            time.sleep(POLL_SECONDS)
+        self._fd = fd
+        # Who holds it, for whoever looks at the file; the lock itself is the OS lock
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()} {time.time()}".encode())
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        try:
+            _unlock(fd)
+        finally:
+            os.close(fd)
+
+    def __enter__(self) -> FileLock:
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.release()
@@ -1,12 +1,21 @@
 import asyncio
 import json
-from collections import Counter
-import pandas as pd
-import requests
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Optional
+
+from util import http_client
+from util.concurrency import bounded_gather
+from util.consumption_store import ConsumptionStore
+from util.pocketbase import PocketBaseError, iter_records
+from util.report_writer import ReportFormat, write_report
+from util.std_pkg import DEFAULT_DFMS_PATH, EXCLUDED_PREFIXES, StdPkgEstimator, upsert_std_pkg
 
 DFMS_GET_WO_PN_URL = 'https://emdii-webtool.foxconn-na.com/api/getWO_PKGID?'
-POCKET_BASE_URL = "http://10.13.32.220:8090/api/collections/STD_PKG/records"
-POCKET_BASE_GET_WO_URL = "http://10.13.32.220:8090/api/collections/WO_STATUS/records?perPage=1000"
+POCKET_BASE = "http://10.13.32.220:8090"
+DEFAULT_FETCH_LIMIT = 16  # in-flight getWO_PKGID calls
+PROGRESS_EVERY = 50
 
 # def get_wo_pn_deliver_to_production(wo: str):
 #
@@ -18,44 +27,74 @@ POCKET_BASE_GET_WO_URL = "http://10.13.32.220:8090/api/collections/WO_STATUS/rec
 #     else:
 #         return []
 
-async def get_wo_pn_deliver_to_production(wo: str):
-    res = await asyncio.to_thread(requests.get, f"{DFMS_GET_WO_PN_URL}workorder={wo}")
-    await asyncio.sleep(0.01)
+async def get_wo_pn_deliver_to_production(wo: str, executor: Optional[Executor] = None):
+    url = f"{DFMS_GET_WO_PN_URL}workorder={wo}"
+    res = await asyncio.get_running_loop().run_in_executor(executor, partial(http_client.get, url))
 
     if res.status_code == 200:
-        print("success ->",wo)
         return res.json()
-    return []
+    raise RuntimeError(f"HTTP {res.status_code}")
 
 
+def _progress(label: str, every: int = PROGRESS_EVERY):
+    def report(done: int, total: int) -> None:
+        if done % every == 0 or done == total:
+            print(f"{label}: {done}/{total}")
+    return report
 
-async def get_all_wo() -> list[str]:
-    res = await asyncio.to_thread(requests.get, POCKET_BASE_GET_WO_URL)
-    if res.status_code != 200:
-        return []
-    _data = res.json()['items']
-    extract_wo = [record['MO_NUMBER'] for record in _data]
-    return extract_wo
-
-
-async def update_std_pkg():
-    def most_common_number(nums):
-        if not nums:
-            return None  # or raise ValueError
-        return Counter(nums).most_common(1)[0][0]
-    wos = await get_all_wo()
 
-    # wos= ['000390019307']
 
-    complete_data = []
+async def get_all_wo(executor: Optional[Executor] = None) -> list[str]:
+    def read():
+        return [record['MO_NUMBER'] for record in iter_records(POCKET_BASE, "WO_STATUS", fields=["MO_NUMBER"])]
 
-    for wo in wos:
-        data = await get_wo_pn_deliver_to_production(wo)
-
-        for item in data:
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, read)
+    except PocketBaseError as e:
+        print(f"WO_STATUS: {e}")
+        return []
 
 
-            complete_data.append({
+async def update_std_pkg(
+    store: Optional[ConsumptionStore] = None,
+    report_format: Optional[ReportFormat] = None,
+    *,
+    fetch_limit: int = DEFAULT_FETCH_LIMIT,
+    estimator_path: str | Path = DEFAULT_DFMS_PATH,
+):
+    # A private pool sized for the limit: the loop's default executor has only
+    # min(32, cpus + 4) threads and belongs to the caller
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=fetch_limit, thread_name_prefix="std-pkg") as executor:
+        def blocking(func, *args):
+            return loop.run_in_executor(executor, partial(func, *args))
+
+        wos = await get_all_wo(executor)
+
+        # wos= ['000390019307']
+
+        # Counts carried over from earlier runs; each WO's reels are added as it arrives
+        estimator = None if store is not None else await blocking(StdPkgEstimator.load, estimator_path)
+        counted = 0
+
+        async def fetch(wo: str):
+            nonlocal counted
+            data = await get_wo_pn_deliver_to_production(wo, executor)
+            if store is not None:
+                await blocking(store.ingest_wo, wo, data)
+            else:
+                counted += estimator.add_records(data)
+            return data
+
+        # A WO that fails is reported and left out; the others are still used
+        fetched = await bounded_gather(fetch, wos, limit=fetch_limit, progress=_progress("WOs"))
+        failed = [result for result in fetched if not result.ok]
+        for result in failed:
+            print(f"failed {result.item}: {result.error}")
+
+        # save in json file
+        report_rows = (
+            {
                 'part_number': item['HH_PN'],
                 'qty': item['QTY'],
                 'pkg_id': item['PKG_ID'],
@@ -64,30 +103,19 @@ async def update_std_pkg():
                 'date': item['CREATED_DATE'],
                 'wo': item['WO'],
                 'remark': item['REMARKS'],
-            })
-
-    # save in json file
-    pd.DataFrame(complete_data).to_excel('pn_deliver_to_production.xlsx', index=False)
-
-
-    unique_pn = set(item['part_number'] for item in complete_data)
-
-    pn_dict = {pn: [] for pn in unique_pn}
-
-    for item in complete_data:
-        if item['pkg_id'][:2] in ['XR', 'HL']:
-            continue
-        pn_dict[item['part_number']].append(item['qty'])
-
-    for pn, qtys in pn_dict.items():
-        _mc = most_common_number(qtys)
-        if not _mc:
-            continue
-        await asyncio.to_thread(
-            requests.post,
-            POCKET_BASE_URL,
-            json={"part_number": pn, "std_pkg": _mc},
+            }
+            for result in fetched if result.ok
+            for item in result.value
         )
+        await blocking(write_report, report_rows, 'pn_deliver_to_production.xlsx', report_format)
+
+        if store is not None:
+            std_pkg = store.std_pkg(exclude_prefixes=EXCLUDED_PREFIXES)
+        else:
+            await blocking(estimator.save, estimator_path)
+            print(f"std_pkg: {counted} new reels, {len(estimator)} PNs")
+            std_pkg = estimator.as_dict()
 
+        await blocking(upsert_std_pkg, POCKET_BASE, std_pkg)
 
-    print('susccess')
+    print(f'done: {len(wos) - len(failed)}/{len(wos)} WOs')
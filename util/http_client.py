@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from util.json_stream import DEFAULT_CHUNK_SIZE, iter_json_array
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+POOL_CONNECTIONS = 16  # number of hosts kept in the pool
+POOL_MAXSIZE = 32  # keep-alive connections per host, enough for the batch worker pools
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    # Connect errors are retried for every method; read errors and retryable statuses only
+    # for idempotent ones (urllib3 default), so POSTs to PocketBase are never sent twice.
+    retry = Retry(
+        total=DEFAULT_RETRIES,
+        connect=DEFAULT_RETRIES,
+        read=DEFAULT_RETRIES,
+        status=DEFAULT_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Process-wide session shared by every upstream integration (emdii-webtool, PocketBase, SWH)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def request(method: str, url: str, *, timeout: float = DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+    return get_session().request(method, url, timeout=timeout, **kwargs)
+
+
+def get(url: str, *, timeout: float = DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+    return request("GET", url, timeout=timeout, **kwargs)
+
+
+def post(url: str, *, timeout: float = DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+    return request("POST", url, timeout=timeout, **kwargs)
+
+
+def patch(url: str, *, timeout: float = DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+    return request("PATCH", url, timeout=timeout, **kwargs)
+
+
+def get_json(url: str, *, timeout: float = DEFAULT_TIMEOUT) -> Any:
+    try:
+        resp = get(url, timeout=timeout)
+        resp.raise_for_status()
+        return resp.json()
+    except requests.exceptions.Timeout as e:
+        raise RuntimeError(f"Request timed out after {timeout}s") from e
+    except requests.exceptions.HTTPError as e:
+        raise RuntimeError(f"HTTP error: {e.response.status_code}") from e
+    except requests.exceptions.RequestException as e:
+        raise RuntimeError("Request failed") from e
+    except ValueError as e:
+        raise RuntimeError("Invalid JSON response") from e
+
+
+def stream_json(url: str, *, timeout: float = DEFAULT_TIMEOUT) -> Iterator[Any]:
+    """Like get_json for endpoints returning a JSON array, but yields the records while the body downloads."""
+    try:
+        with get(url, timeout=timeout, stream=True) as resp:
+            resp.raise_for_status()
+            yield from iter_json_array(resp.iter_content(chunk_size=DEFAULT_CHUNK_SIZE))
+    except requests.exceptions.Timeout as e:
+        raise RuntimeError(f"Request timed out after {timeout}s") from e
+    except requests.exceptions.HTTPError as e:
+        raise RuntimeError(f"HTTP error: {e.response.status_code}") from e
+    except requests.exceptions.RequestException as e:
+        raise RuntimeError("Request failed") from e
+    except ValueError as e:
+        raise RuntimeError("Invalid JSON response") from e
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from util.model_ingest import build
+from util.smw_stock import COLUMNS, SWHInventoryItem
+from util.swh_snapshot import SwhSnapshot
+
+FIELDS = list(COLUMNS.values())
+
+
+class InventoryStore:
+    """
+    SWH stock indexed once for the analyses that used to rescan the flat list:
+    PN -> total qty, (PN, AREA_CODE) -> qty, PN -> reels and POSITION_CODE -> reels.
+    Reels are kept as columns and only turned into SWHInventoryItems when asked for.
+    Reels without a PN are left out of the PN indexes, as step_3 always did.
+    """
+
+    def __init__(self, columns: Dict[str, List[Any]]):
+        self.columns = columns
+        self._totals: Dict[str, float] = {}
+        self._area_totals: Dict[Optional[str], Dict[str, float]] = {}
+        self._rows_by_pn: Dict[str, List[int]] = {}
+        self._rows_by_position: Dict[str, List[int]] = {}
+
+        for idx, (pn, qty, position, area) in enumerate(
+            zip(columns["PN"], columns["QTY"], columns["POSITION_CODE"], columns["AREA_CODE"])
+        ):
+            if position:
+                self._rows_by_position.setdefault(position, []).append(idx)
+            if not pn:
+                continue
+            qty = float(qty or 0)
+            self._totals[pn] = self._totals.get(pn, 0) + qty
+            area_totals = self._area_totals.setdefault(area, {})
+            area_totals[pn] = area_totals.get(pn, 0) + qty
+            self._rows_by_pn.setdefault(pn, []).append(idx)
+
+    @classmethod
+    def from_items(cls, items: Iterable[SWHInventoryItem]) -> InventoryStore:
+        columns: Dict[str, List[Any]] = {field: [] for field in FIELDS}
+        for item in items:
+            for field in FIELDS:
+                columns[field].append(getattr(item, field))
+        return cls(columns)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> InventoryStore:
+        """From dicts with the SWHInventoryItem fields, e.g. a saved swh_data.json."""
+        columns: Dict[str, List[Any]] = {field: [] for field in FIELDS}
+        for record in records:
+            for field in FIELDS:
+                columns[field].append(record.get(field))
+        return cls(columns)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: SwhSnapshot) -> InventoryStore:
+        return cls(snapshot.columns)
+
+    def __len__(self) -> int:
+        return len(self.columns["PKG_ID"])
+
+    def pns(self) -> List[str]:
+        return list(self._totals)
+
+    def areas(self) -> List[Optional[str]]:
+        return list(self._area_totals)
+
+    def qty(self, pn: str, areas: Optional[Sequence[str]] = None) -> float:
+        if areas is None:
+            return self._totals.get(pn, 0)
+        return sum(self._area_totals.get(area, {}).get(pn, 0) for area in areas)
+
+    def totals(self, areas: Optional[Sequence[str]] = None) -> Dict[str, float]:
+        """{pn: qty}, over every area or only the given ones. A new dict the caller may modify."""
+        if areas is None:
+            return dict(self._totals)
+        totals: Dict[str, float] = {}
+        for area in areas:
+            for pn, qty in self._area_totals.get(area, {}).items():
+                totals[pn] = totals.get(pn, 0) + qty
+        return totals
+
+    def _item(self, idx: int) -> SWHInventoryItem:
+        return build(SWHInventoryItem, False, **{field: self.columns[field][idx] for field in FIELDS})
+
+    def reels(self, pn: str, areas: Optional[Sequence[str]] = None) -> List[SWHInventoryItem]:
+        rows = self._rows_by_pn.get(pn, ())
+        if areas is not None:
+            area_column = self.columns["AREA_CODE"]
+            rows = [idx for idx in rows if area_column[idx] in areas]
+        return [self._item(idx) for idx in rows]
+
+    def at_position(self, position: str) -> List[SWHInventoryItem]:
+        return [self._item(idx) for idx in self._rows_by_position.get(position, ())]
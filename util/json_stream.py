@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import codecs
+import json
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+
+def iter_json_array(chunks: Iterable[bytes | str]) -> Iterator[Any]:
+    """
+    Incrementally parse a top-level JSON array from a stream of chunks and yield its
+    elements one by one, so only the current record (plus one chunk) is held in memory.
+    A top-level null yields nothing.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer = ""
+    pos = 0
+    eof = False
+    started = False
+
+    def more() -> bool:
+        nonlocal buffer, pos, eof
+        if eof:
+            return False
+        for chunk in chunks:
+            text = utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                buffer = buffer[pos:] + text
+                pos = 0
+                return True
+        buffer = buffer[pos:] + utf8.decode(b"", final=True)
+        pos = 0
+        eof = True
+        return False
+
+    def skip(chars: str) -> bool:
+        # Advance past chars; False once the stream is exhausted
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer):
+                return True
+            if not more():
+                return False
+
+    while True:
+        if not skip(_WHITESPACE if started else _WHITESPACE + "\ufeff"):
+            if not started:
+                return
+            raise ValueError("Unterminated JSON array")
+
+        if not started:
+            if buffer[pos] != "[":
+                # Not an array (null / error object): small, so just read and decode the rest
+                while more():
+                    pass
+                if json.loads(buffer[pos:]) is None:
+                    return
+                raise ValueError("Expected a JSON array")
+            pos += 1
+            started = True
+            continue
+
+        if buffer[pos] == "]":
+            return
+        if buffer[pos] == ",":
+            pos += 1
+            continue
+
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if more():
+                    continue
+                raise
+            # A number cut at a chunk edge ("-25" of "-2500.0") decodes fine; it is only complete
+            # once the next character is a delimiter
+            if (end == len(buffer) or buffer[end] not in _WHITESPACE + ",]") and more():
+                continue
+            break
+        pos = end
+        yield value
+
+
+def iter_json_file(path: str | Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Any]:
+    with open(path, "rb") as f:
+        yield from iter_json_array(iter(lambda: f.read(chunk_size), b""))
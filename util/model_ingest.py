@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import copy
+from typing import Any, Callable, Dict, NamedTuple, Type, TypeVar
+
+from pydantic import BaseModel
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+_IMMUTABLE = (type(None), bool, int, float, str, bytes)
+_set = object.__setattr__
+
+
+class _Plan(NamedTuple):
+    n_fields: int
+    defaults: Dict[str, Any]  # immutable defaults, shared as is
+    factories: Dict[str, Callable[[], Any]]  # everything else, copied per instance
+    fallback: bool  # private attributes / extras: leave it to model_construct
+
+
+_plans: Dict[type, _Plan] = {}
+
+
+def _plan(model: type) -> _Plan:
+    plan = _plans.get(model)
+    if plan is None:
+        defaults: Dict[str, Any] = {}
+        factories: Dict[str, Callable[[], Any]] = {}
+        for name, info in model.model_fields.items():
+            if info.is_required():
+                continue
+            if info.default_factory is not None:
+                factories[name] = lambda info=info: info.get_default(call_default_factory=True)
+            elif isinstance(info.default, _IMMUTABLE):
+                defaults[name] = info.default
+            elif isinstance(info.default, (list, dict, set)) and not info.default:
+                factories[name] = type(info.default)
+            else:
+                factories[name] = lambda default=info.default: copy.deepcopy(default)
+        fallback = bool(model.__private_attributes__) or model.model_config.get("extra") == "allow"
+        plan = _plans[model] = _Plan(len(model.model_fields), defaults, factories, fallback)
+    return plan
+
+
+def construct(model: Type[ModelT], fields: Dict[str, Any]) -> ModelT:
+    """
+    Lean model_construct: fill in the defaults and set the instance dict, nothing else.
+    model_construct handles aliases and extras in Python and ends up slower than validating
+    in pydantic-core; this is what makes skipping validation actually pay off.
+    """
+    plan = _plan(model)
+    if plan.fallback:
+        return model.model_construct(**fields)
+
+    fields_set = set(fields)
+    if len(fields_set) < plan.n_fields:
+        for name, value in plan.defaults.items():
+            if name not in fields_set:
+                fields[name] = value
+        for name, factory in plan.factories.items():
+            if name not in fields_set:
+                fields[name] = factory()
+
+    obj = model.__new__(model)
+    _set(obj, "__dict__", fields)
+    _set(obj, "__pydantic_fields_set__", fields_set)
+    _set(obj, "__pydantic_extra__", None)
+    _set(obj, "__pydantic_private__", None)
+    return obj
+
+
+def build(model: Type[ModelT], trusted: bool = False, /, **fields: Any) -> ModelT:
+    """
+    model(**fields), or an unvalidated instance when the source is trusted: no validation
+    and no coercion, so the caller must already pass the declared types (nested models
+    included). Only for sources whose types are known, i.e. SAP detail JSON; never raw
+    pandas/openpyxl values. Strict validation stays the default.
+    """
+    if trusted:
+        return construct(model, fields)
+    return model(**fields)
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Mapping, Tuple
+
+import numpy as np
+import pandas as pd
+
+from util.wo_details import DeliverMaterialList, MaterialGroup
+
+GROUP_COLUMNS = ["wo", "group_idx", "group_wo", "high_level_pn", "total_consumption"]
+MATERIAL_COLUMNS = ["wo", "group_idx", "part_number"]
+DELIVERY_COLUMNS = ["wo", "part_number", "reals", "qty", "std_pkg"]
+
+
+def groups_to_frames(groups_by_wo: Mapping[str, List[MaterialGroup]]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Flatten the material groups of many WOs into a group table and a group -> part number table."""
+    groups: Dict[str, list] = {column: [] for column in GROUP_COLUMNS}
+    materials: Dict[str, list] = {column: [] for column in MATERIAL_COLUMNS}
+
+    for wo, wo_groups in groups_by_wo.items():
+        for idx, group in enumerate(wo_groups):
+            groups["wo"].append(wo)
+            groups["group_idx"].append(idx)
+            groups["group_wo"].append(group.wo)
+            groups["high_level_pn"].append(group.high_level_pn)
+            groups["total_consumption"].append(group.total_consumption)
+            for material in group.materials:
+                materials["wo"].append(wo)
+                materials["group_idx"].append(idx)
+                materials["part_number"].append(material.part_number)
+
+    return (
+        pd.DataFrame(groups, columns=GROUP_COLUMNS).astype({"group_idx": "int64", "total_consumption": "int64"}),
+        pd.DataFrame(materials, columns=MATERIAL_COLUMNS).astype({"group_idx": "int64"}),
+    )
+
+
+def summaries_to_frame(summaries_by_wo: Mapping[str, Dict[str, Dict[str, Any]]]) -> pd.DataFrame:
+    """Flatten summary_delivery() outputs keyed by WO into one delivery table."""
+    deliveries: Dict[str, list] = {column: [] for column in DELIVERY_COLUMNS}
+    for wo, summary in summaries_by_wo.items():
+        for pn, item in summary.items():
+            if not item:
+                continue
+            deliveries["wo"].append(wo)
+            deliveries["part_number"].append(pn)
+            deliveries["reals"].append(item["reals"])
+            deliveries["qty"].append(item["qty"])
+            deliveries["std_pkg"].append(item["std_pkg"])
+
+    return pd.DataFrame(deliveries, columns=DELIVERY_COLUMNS).astype(
+        {"reals": "int64", "qty": "int64", "std_pkg": "int64"}
+    )
+
+
+def overstock_frame(groups: pd.DataFrame, materials: pd.DataFrame, deliveries: pd.DataFrame) -> pd.DataFrame:
+    """
+    Columnar equivalent of MaterialGroupAndDeliversHandler.add_deliver_materials followed by
+    overstock_calculation, for every (WO, group) at once. Groups whose std_pack is 0 keep the
+    default zeros, exactly like the handler.
+    """
+    delivered = materials.merge(deliveries, on=["wo", "part_number"], how="inner", sort=False)
+    per_group = delivered.groupby(["wo", "group_idx"], sort=False).agg(
+        total_deliver_reals=("reals", "sum"),
+        total_deliver=("qty", "sum"),
+        std_pack=("std_pkg", "max"),
+    )
+
+    frame = groups.merge(per_group, left_on=["wo", "group_idx"], right_index=True, how="left", sort=False)
+    for column in ("total_deliver_reals", "total_deliver", "std_pack"):
+        frame[column] = frame[column].fillna(0).astype("int64")
+
+    has_pack = frame["std_pack"].to_numpy() > 0
+    consumption = frame["total_consumption"].to_numpy()
+    overstock = np.where(has_pack, frame["total_deliver"].to_numpy() - consumption, 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frame["over_deliver_rate"] = np.where(has_pack, overstock / consumption, 0.0)
+        frame["severity"] = np.where(has_pack, overstock / np.where(has_pack, frame["std_pack"], 1), 0.0)
+
+    frame["total_deliver_reals"] = np.where(has_pack, frame["total_deliver_reals"], 0)
+    frame["total_deliver"] = np.where(has_pack, frame["total_deliver"], 0)
+    frame["overstock"] = overstock
+    return frame.reset_index(drop=True)
+
+
+def overdeliver_summary(
+    frame: pd.DataFrame,
+    headers: Mapping[str, Tuple[str, str, str, Any]],
+) -> Dict[str, Tuple[int, float, List[dict]]]:
+    """
+    Columnar equivalent of run_utils.overdeliver_to_excel for every WO in the frame.
+    headers maps WO -> (line, platform, sku, created_date). Returns WO -> (total overdeliver
+    components, total overdeliver reals, severity rows sorted by severity desc).
+    """
+    positive = frame[frame["severity"] > 0].sort_values("group_idx", kind="stable")
+    totals = positive.groupby("wo", sort=False).agg(
+        components=("overstock", "sum"),
+        # Python sum in group order: pandas' sum adds floats in another order and can differ
+        # from overdeliver_to_excel in the last digit
+        reals=("severity", lambda severity: sum(severity.tolist())),
+    )
+
+    flagged = frame[frame["severity"] > 1].copy()
+    # Python round() on the few flagged rows keeps the exact rounding overdeliver_to_excel uses
+    flagged["severity"] = [round(value, 2) for value in flagged["severity"].tolist()]
+    flagged = flagged.sort_values(["wo", "severity", "group_idx"], ascending=[True, False, True], kind="stable")
+
+    rows_by_wo: Dict[str, List[dict]] = {}
+    for record in flagged.itertuples(index=False):
+        line, platform, sku, created_date = headers[record.wo]
+        rows_by_wo.setdefault(record.wo, []).append({
+            "line": line,
+            "platform": platform,
+            "sku": sku,
+            "wo": record.group_wo,
+            "created_date": created_date,
+            "high_level_pn": record.high_level_pn,
+            "total_consumption": record.total_consumption,
+            "total_deliver": record.total_deliver,
+            "overstock": record.overstock,
+            "severity": record.severity,
+        })
+
+    result: Dict[str, Tuple[int, float, List[dict]]] = {}
+    for wo in frame["wo"].unique():
+        if wo in totals.index:
+            components, reals = int(totals.at[wo, "components"]), float(totals.at[wo, "reals"])
+        else:
+            components, reals = 0, 0
+        result[wo] = components, reals, rows_by_wo.get(wo, [])
+    return result
+
+
+def assign_overstock(
+    groups_by_wo: Mapping[str, List[MaterialGroup]],
+    summaries_by_wo: Mapping[str, Dict[str, Dict[str, Any]]],
+    frame: pd.DataFrame,
+) -> None:
+    """Write the columnar results back onto the MaterialGroup objects (for the per-WO JSON dumps)."""
+    columns = ["wo", "group_idx", "std_pack", "total_deliver_reals", "total_deliver", "overstock",
+               "over_deliver_rate", "severity"]
+    for wo, idx, std_pack, reals, deliver, overstock, rate, severity in frame[columns].itertuples(index=False):
+        group = groups_by_wo[wo][idx]
+        summary = summaries_by_wo.get(wo, {})
+        for material in group.materials:
+            item = summary.get(material.part_number)
+            if item:
+                group.deliver_materials.append(
+                    DeliverMaterialList.model_construct(
+                        pn=material.part_number,
+                        reals=item["reals"],
+                        qty=item["qty"],
+                        std_pkg=item["std_pkg"],
+                        items=item["items"],
+                    )
+                )
+        group.std_pack = int(std_pack)
+        if std_pack > 0:
+            group.total_deliver_reals = int(reals)
+            group.total_deliver = int(deliver)
+            group.overstock = int(overstock)
+            group.over_deliver_rate = float(rate)
+            group.severity = float(severity)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import requests
+
+from util import http_client
+from util.concurrency import DEFAULT_MAX_WORKERS, bounded_map
+
+DEFAULT_PER_PAGE = 500
+DEFAULT_BATCH_SIZE = 50  # PocketBase's default batch maxRequests
+DEFAULT_SORT = "id"  # a stable order, so concurrently fetched pages neither overlap nor skip records
+
+
+class PocketBaseError(RuntimeError):
+    pass
+
+
+def quote(value: Any) -> str:
+    """A value as a PocketBase filter literal."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def any_of(field: str, values: Iterable[Any]) -> str:
+    """Filter matching records whose field equals one of values, e.g. (DEFAULT_LINE='J01' || DEFAULT_LINE='J02')."""
+    return "(" + " || ".join(f"{field}={quote(value)}" for value in values) + ")"
+
+
+def all_of(*filters: Optional[str]) -> Optional[str]:
+    filters = tuple(f for f in filters if f)
+    if not filters:
+        return None
+    return " && ".join(filters)
+
+
+def _get_page(url: str, params: Dict[str, Any], page: int, timeout: float) -> Dict[str, Any]:
+    try:
+        resp = http_client.get(url, params={**params, "page": page}, timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        raise PocketBaseError(f"{url} page {page}: {e}") from e
+    if resp.status_code != 200:
+        raise PocketBaseError(f"{url} page {page}: HTTP {resp.status_code}")
+    try:
+        return resp.json()
+    except ValueError as e:
+        raise PocketBaseError(f"{url} page {page}: invalid JSON: {e}") from e
+
+
+def iter_records(
+    base_url: str,
+    collection: str,
+    *,
+    filter: Optional[str] = None,
+    fields: Optional[Sequence[str]] = None,
+    sort: str = DEFAULT_SORT,
+    per_page: int = DEFAULT_PER_PAGE,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    timeout: float = http_client.DEFAULT_TIMEOUT,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Every record of a collection matching filter, with only the given fields. The first
+    page tells how many there are; the others are then fetched concurrently and yielded
+    in page order. Raises PocketBaseError if any page fails, so callers never get a
+    silently partial list.
+    """
+    url = f"{base_url.rstrip('/')}/api/collections/{collection}/records"
+    params: Dict[str, Any] = {"perPage": per_page, "sort": sort}
+    if filter:
+        params["filter"] = filter
+    if fields:
+        params["fields"] = ",".join(fields)
+
+    first = _get_page(url, params, 1, timeout)
+    yield from first.get("items") or []
+    total_pages = first.get("totalPages") or 1
+    if total_pages <= 1:
+        return
+
+    params["skipTotal"] = 1  # the count was only needed once
+    pending: Dict[int, List[Dict[str, Any]]] = {}
+    next_page = 2
+    for result in bounded_map(
+        lambda page: _get_page(url, params, page, timeout), range(2, total_pages + 1), max_workers=max_workers
+    ):
+        if not result.ok:
+            if isinstance(result.error, PocketBaseError):
+                raise result.error
+            raise PocketBaseError(f"{url} page {result.item}: {result.error}") from result.error
+        pending[result.item] = result.value.get("items") or []
+        while next_page in pending:
+            yield from pending.pop(next_page)
+            next_page += 1
+
+
+def batch(
+    base_url: str,
+    requests: Sequence[Dict[str, Any]],
+    *,
+    chunk_size: int = DEFAULT_BATCH_SIZE,
+    timeout: float = http_client.DEFAULT_TIMEOUT,
+) -> List[Dict[str, Any]]:
+    """
+    Send record requests ({"method", "url", "body"}, url relative to base_url) through
+    /api/batch, chunk_size per call. Each chunk is one transaction on the server; chunks
+    are sent in order, so when one fails the earlier ones have already been applied.
+    Needs batch requests enabled in the PocketBase settings.
+    """
+    url = f"{base_url.rstrip('/')}/api/batch"
+    responses: List[Dict[str, Any]] = []
+    for start in range(0, len(requests), chunk_size):
+        chunk = list(requests[start: start + chunk_size])
+        resp = http_client.post(url, json={"requests": chunk}, timeout=timeout)
+        if resp.status_code != 200:
+            raise PocketBaseError(
+                f"{url}: HTTP {resp.status_code} on requests {start}-{start + len(chunk) - 1} "
+                f"({start} already applied): {resp.text[:200]}"
+            )
+        responses.extend(resp.json())
+    return responses
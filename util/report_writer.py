@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import csv
+import math
+from datetime import date, datetime
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+DEFAULT_DATETIME_FORMAT = "yyyy-mm-dd hh:mm:ss"
+DEFAULT_DATE_FORMAT = "yyyy-mm-dd"
+
+
+class ReportFormat(str, Enum):
+    XLSX = "xlsx"  # for people; constant-memory write-only workbook
+    PARQUET = "parquet"  # for machines
+    CSV = "csv"
+
+
+def _rows(data: pd.DataFrame | Iterable[Dict[str, Any]], columns: Optional[Sequence[str]]) -> tuple[List[str], Iterator[tuple]]:
+    if isinstance(data, pd.DataFrame):
+        header = list(columns or data.columns)
+        return [str(c) for c in header], data[header].itertuples(index=False, name=None)
+
+    records = iter(data)
+    first = next(records, None)
+    if first is None:
+        return list(columns or []), iter(())
+    header = list(columns or first.keys())
+
+    def generate():
+        yield tuple(first.get(c) for c in header)
+        for record in records:
+            yield tuple(record.get(c) for c in header)
+
+    return header, generate()
+
+
+def _cell_value(value: Any) -> Any:
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.replace(tzinfo=None)  # Excel has no time zones
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):  # numpy scalars
+        value = value.item()
+    if isinstance(value, (list, dict, tuple)):
+        value = str(value)
+    return value
+
+
+def _write_xlsx(path: Path, header: List[str], rows: Iterator[tuple], datetime_format: str) -> None:
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+
+    bold = Font(bold=True)
+    header_cells = []
+    for name in header:
+        cell = WriteOnlyCell(sheet, value=name)
+        cell.font = bold
+        header_cells.append(cell)
+    sheet.append(header_cells)
+
+    for row in rows:
+        values = []
+        for value in row:
+            value = _cell_value(value)
+            if isinstance(value, (datetime, date)):
+                cell = WriteOnlyCell(sheet, value=value)
+                cell.number_format = datetime_format if isinstance(value, datetime) else DEFAULT_DATE_FORMAT
+                value = cell
+            values.append(value)
+        sheet.append(values)
+
+    workbook.save(path)
+
+
+def _write_csv(path: Path, header: List[str], rows: Iterator[tuple]) -> None:
+    with path.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(["" if (v := _cell_value(value)) is None else v for value in row])
+
+
+def write_report(
+    data: pd.DataFrame | Iterable[Dict[str, Any]],
+    path: str | Path,
+    report_format: ReportFormat | str | None = None,
+    *,
+    columns: Optional[Sequence[str]] = None,
+    datetime_format: str = DEFAULT_DATETIME_FORMAT,
+) -> Path:
+    """
+    Write a table (DataFrame or iterable of row dicts) as xlsx, parquet or csv. The format
+    defaults to the extension of path; an explicit format replaces the extension. Returns
+    the path actually written.
+    """
+    path = Path(path)
+    report_format = ReportFormat(report_format or path.suffix.lstrip(".").lower() or ReportFormat.XLSX)
+    path = path.with_suffix(f".{report_format.value}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if report_format == ReportFormat.PARQUET:
+        df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(list(data), columns=columns)
+        df.to_parquet(path, index=False)
+        return path
+
+    header, rows = _rows(data, columns)
+    if report_format == ReportFormat.CSV:
+        _write_csv(path, header, rows)
+    else:
+        _write_xlsx(path, header, rows, datetime_format)
+    return path
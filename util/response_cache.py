@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Optional, Tuple
+
+DEFAULT_CACHE_DIR = Path("cache") / "responses"
+DEFAULT_TTL_SECONDS = 6 * 60 * 60
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class CacheMode(str, Enum):
+    USE = "use"  # serve fresh entries, fetch and store misses
+    REFRESH = "refresh"  # always fetch, overwrite the stored entry
+    BYPASS = "bypass"  # never read or write the cache
+
+
+class ResponseCache:
+    """
+    On-disk JSON response cache keyed by request URL.
+
+    Entries stored for open work orders expire after ttl_seconds; entries stored for
+    closed work orders never expire. When the directory grows past max_bytes the least
+    recently used entries (by file mtime, refreshed on every hit) are evicted.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path = DEFAULT_CACHE_DIR,
+        *,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        mode: CacheMode = CacheMode.USE,
+    ):
+        self.directory = Path(directory)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.mode = CacheMode(mode)
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    def _path(self, key: str) -> Path:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return self.directory / digest[:2] / f"{digest}.json"
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        if self.mode != CacheMode.USE:
+            return False, None
+
+        path = self._path(key)
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False, None
+
+        if entry.get("key") != key:
+            return False, None
+        if not entry.get("closed") and time.time() - entry.get("stored_at", 0) > self.ttl_seconds:
+            return False, None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return True, entry.get("payload")
+
+    def put(self, key: str, payload: Any, *, closed: bool = False) -> None:
+        if self.mode == CacheMode.BYPASS:
+            return
+
+        path = self._path(key)
+        body = json.dumps({"key": key, "stored_at": time.time(), "closed": closed, "payload": payload})
+
+        try:
+            previous = path.stat().st_size
+        except FileNotFoundError:
+            previous = 0
+        write_atomic(path, lambda tmp: tmp.write_text(body, encoding="utf-8"))
+
+        with self._lock:
+            self._size = self._disk_size() if self._size is None else self._size - previous + len(body)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Any], *, closed: bool = False) -> Any:
+        hit, payload = self.get(key)
+        if hit:
+            return payload
+        payload = fetch()
+        self.put(key, payload, closed=closed)
+        return payload
+
+    def clear(self) -> None:
+        with self._lock:
+            for path in self._entries():
+                path.unlink(missing_ok=True)
+            self._size = 0
+
+    def _entries(self):
+        if not self.directory.exists():
+            return []
+        return list(self.directory.glob("*/*.json"))
+
+    def _disk_size(self) -> int:
+        return sum(path.stat().st_size for path in self._entries())
+
+    def _evict(self) -> None:
+        # Trim to 90% of the budget so every put past the limit does not rescan the directory
+        target = int(self.max_bytes * 0.9)
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            path.unlink(missing_ok=True)
+            size -= entry_size
+        self._size = size
+
+
+def cached_call(cache: Optional[ResponseCache], key: str, fetch: Callable[[], Any], *, closed: bool = False) -> Any:
+    if cache is None:
+        return fetch()
+    return cache.get_or_fetch(key, fetch, closed=closed)
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
+import tempfile
 from io import BytesIO
-from typing import Any, Dict, List, Optional
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
 
-import requests
 from openpyxl import load_workbook
 from pydantic import BaseModel
 
+from util import http_client
+
 UPSTREAM_URL = "http://10.13.55.228:5004/api/outPut/exportMaterialStockToExcel"
 
 
@@ -18,13 +20,22 @@ class SWHInventoryItem(BaseModel):
     AREA_CODE: Optional[str] = None
 
 
-def get_swh_inventory(
-    *,
-    upstream_url: str = UPSTREAM_URL,
-    timeout_seconds: int = 60,
-    body: Optional[Dict[str, Any]] = None,
-) -> List[SWHInventoryItem]:
-    payload = body or {
+DEFAULT_BATCH_SIZE = 10_000
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+SNAPSHOT_TTL_SECONDS = 15 * 60
+
+# Export header -> SWHInventoryItem field
+COLUMNS = {
+    "ReelId": "PKG_ID",
+    "PN": "PN",
+    "Qty": "QTY",
+    "PositionCode": "POSITION_CODE",
+    "AreaCode": "AREA_CODE",
+}
+
+
+def default_body() -> Dict[str, Any]:
+    return {
         "reelId": "",
         "pn": "",
         "lot": "",
@@ -37,39 +48,164 @@ def get_swh_inventory(
         "createEndTime": None,
     }
 
-    res = requests.post(upstream_url, json=payload, timeout=timeout_seconds)
-    if res.status_code < 200 or res.status_code >= 300:
-        raise RuntimeError(f"Upstream error: {res.status_code}")
 
-    workbook = load_workbook(filename=BytesIO(res.content), data_only=True)
-    sheet = workbook[workbook.sheetnames[0]]
+def fetch_swh_export(
+    *,
+    upstream_url: str = UPSTREAM_URL,
+    timeout_seconds: int = 60,
+    body: Optional[Dict[str, Any]] = None,
+) -> BinaryIO:
+    """Download the export into a spooled temp file (in memory up to SPOOL_MAX_BYTES, then on disk)."""
+    with http_client.post(upstream_url, json=body or default_body(), timeout=timeout_seconds, stream=True) as res:
+        if res.status_code < 200 or res.status_code >= 300:
+            raise RuntimeError(f"Upstream error: {res.status_code}")
+
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        try:
+            for chunk in res.iter_content(chunk_size=64 * 1024):
+                spool.write(chunk)
+        except BaseException:
+            spool.close()  # a rolled-over spool is a temp file on disk
+            raise
+    spool.seek(0)
+    return spool
+
 
-    rows = list(sheet.iter_rows(values_only=True))
-    if not rows:
-        return []
+def iter_sheet_rows(source: bytes | BinaryIO) -> Iterator[tuple]:
+    """Values of the export's first worksheet, row by row, from openpyxl's read-only mode."""
+    workbook = load_workbook(
+        filename=BytesIO(source) if isinstance(source, bytes) else source, read_only=True, data_only=True
+    )
+    try:
+        sheet = workbook[workbook.sheetnames[0]]
+        # Generated exports do not always carry a correct <dimension>; read the rows that are there
+        sheet.reset_dimensions()
+        yield from sheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
 
-    headers = [str(value).strip() if value is not None else "" for value in rows[0]]
-    data_rows = rows[1:]
 
-    mapping = {
-        "ReelId": "PKG_ID",
-        "PN": "PN",
-        "Qty": "QTY",
-        "PositionCode": "POSITION_CODE",
-        "AreaCode": "AREA_CODE",
-    }
+def _column_map(header: tuple) -> List[tuple[str, int]]:
+    # (field, column index) resolved once; columns missing from the export stay None
+    headers = [str(value).strip() if value is not None else "" for value in header]
+    return [(field, headers.index(key)) for key, field in COLUMNS.items() if key in headers]
+
+
+def _as_str(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))  # numeric PNs / positions come back from the sheet as floats
+    return str(value)
+
+
+def _as_int(value: Any) -> Optional[int]:
+    if value is None or type(value) is int:
+        return value
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"QTY is not a whole number: {value!r}")
+        return int(value)
+    return int(str(value).strip())
+
+
+# The sheet cells are whatever openpyxl read (int, float or str); the snapshot columns keep
+# the declared types
+_TYPES = {field: int if field == "QTY" else str for field in COLUMNS.values()}
+_CONVERTERS = {field: _as_int if field == "QTY" else _as_str for field in COLUMNS.values()}
+
+
+def iter_swh_inventory(source: bytes | BinaryIO) -> Iterator[SWHInventoryItem]:
+    """
+    Yield the rows of an SWH stock export (bytes or a binary file) as SWHInventoryItems.
+    Always validated: the cells are untyped, and pydantic-core coerces them faster than
+    converting them in Python for the trusted path would.
+    """
+    rows = iter_sheet_rows(source)
+    header = next(rows, None)
+    if header is None:
+        return
+
+    columns = _column_map(header)
+    missing = {field: None for field in COLUMNS.values() if field not in dict(columns)}
+    for row in rows:
+        width = len(row)
+        record = {field: row[idx] if idx < width else None for field, idx in columns}
+        if missing:
+            record.update(missing)
+        yield SWHInventoryItem(**record)
+
+
+def iter_swh_inventory_batches(
+    source: bytes | BinaryIO,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[Dict[str, List[Any]]]:
+    """
+    Same rows as iter_swh_inventory, as {field: values} column batches of up to batch_size
+    rows, with the values converted to the SWHInventoryItem field types. No model is built;
+    this is the fast path the snapshot is filled from.
+    """
+    rows = iter_sheet_rows(source)
+    header = next(rows, None)
+    if header is None:
+        return
+
+    columns = _column_map(header)
+    buffered: List[tuple] = []
+    for row in rows:
+        buffered.append(row)
+        if len(buffered) == batch_size:
+            yield _column_batch(buffered, columns)
+            buffered = []
+    if buffered:
+        yield _column_batch(buffered, columns)
+
+
+def _column_batch(rows: List[tuple], columns: List[tuple[str, int]]) -> Dict[str, List[Any]]:
+    batch: Dict[str, List[Any]] = {field: [None] * len(rows) for field in COLUMNS.values()}
+    for field, idx in columns:
+        values = [row[idx] if idx < len(row) else None for row in rows]
+        # Cells normally already have the field's type: convert a column only when one does not
+        expected = _TYPES[field]
+        if not all(value is None or type(value) is expected for value in values):
+            values = [_CONVERTERS[field](value) for value in values]
+        batch[field] = values
+    return batch
+
+
+def stream_swh_inventory(
+    *,
+    upstream_url: str = UPSTREAM_URL,
+    timeout_seconds: int = 60,
+    body: Optional[Dict[str, Any]] = None,
+) -> Iterator[SWHInventoryItem]:
+    with fetch_swh_export(upstream_url=upstream_url, timeout_seconds=timeout_seconds, body=body) as export:
+        yield from iter_swh_inventory(export)
+
+
+def get_swh_inventory(
+    *,
+    upstream_url: str = UPSTREAM_URL,
+    timeout_seconds: int = 60,
+    body: Optional[Dict[str, Any]] = None,
+    max_age_seconds: float = SNAPSHOT_TTL_SECONDS,
+) -> List[SWHInventoryItem]:
+    """
+    The whole SWH stock. Unfiltered requests are served from the shared on-disk snapshot
+    (util.swh_snapshot) while its last full download is younger than max_age_seconds, so
+    back-to-back jobs and processes download the export once; max_age_seconds=0 always
+    downloads.
+    """
+    if body is None and upstream_url == UPSTREAM_URL and max_age_seconds > 0:
+        from util.swh_snapshot import SwhSnapshotStore  # imports this module
+
+        snapshot = SwhSnapshotStore(timeout_seconds=timeout_seconds).current(max_age_seconds, full=True)
+        return list(snapshot.items())
+
+    return list(stream_swh_inventory(
+        upstream_url=upstream_url, timeout_seconds=timeout_seconds, body=body
+    ))
+
 
-    items: List[SWHInventoryItem] = []
-    for row in data_rows:
-        record: Dict[str, Any] = {}
-        for excel_key, output_key in mapping.items():
-            try:
-                idx = headers.index(excel_key)
-            except ValueError:
-                record[output_key] = None
-                continue
-            value = row[idx] if idx < len(row) else None
-            record[output_key] = value
-        items.append(SWHInventoryItem(**record))
-
-    return items
+def parse_swh_inventory(content: bytes) -> List[SWHInventoryItem]:
+    return list(iter_swh_inventory(content))
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import pickle
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Set, Tuple
+
+from util.atomic_write import write_atomic
+from util.pocketbase import DEFAULT_BATCH_SIZE, batch, iter_records
+
+STD_PKG_COLLECTION = "STD_PKG"
+RECORDS_PATH = f"/api/collections/{STD_PKG_COLLECTION}/records"
+EXCLUDED_PREFIXES = ("XR", "HL")  # PKG_IDs that are not standard packs
+DEFAULT_DFMS_PATH = Path("cache") / "std_pkg_dfms.pkl"
+DEFAULT_SWH_PATH = Path("cache") / "std_pkg_swh.pkl"
+DEFAULT_RETENTION_DAYS = 180
+STATE_VERSION = 2
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def _mode(hist: Dict[Any, int]) -> Any:
+    # First qty with the highest count, in first-seen order: Counter(...).most_common(1)
+    best, best_count = None, 0
+    for qty, count in hist.items():
+        if count > best_count:
+            best, best_count = qty, count
+    return best
+
+
+def _today() -> int:
+    return int(time.time() // SECONDS_PER_DAY)
+
+
+class StdPkgEstimator:
+    """
+    Standard pack per PN as the most common package qty, kept as a qty -> count histogram
+    per PN that is updated as reels arrive instead of recounting every reel ever seen.
+    Each PN's answer is cached, so std_pkg() is a dict lookup.
+
+    With dedupe, reels are counted once per PKG_ID, so a WO or an inventory snapshot can
+    be fed again and only its new reels change the counts. Reels whose PKG_ID starts
+    with one of exclude_prefixes are not counted.
+
+    Counts are kept per day they were counted, and prune() forgets the days (and PKG_IDs)
+    older than retention_days, so the state stays bounded and a supplier's new pack size
+    takes over once the old reels age out. load() prunes; retention_days=None keeps all.
+    """
+
+    def __init__(
+        self,
+        exclude_prefixes: Sequence[str] = EXCLUDED_PREFIXES,
+        *,
+        dedupe: bool = True,
+        retention_days: Optional[int] = DEFAULT_RETENTION_DAYS,
+    ):
+        self.exclude_prefixes = tuple(exclude_prefixes)
+        self.dedupe = dedupe
+        self.retention_days = retention_days
+        self._hist: Dict[str, Dict[Any, int]] = {}  # over the whole window
+        self._days: Dict[str, Dict[int, Dict[Any, int]]] = {}  # pn -> day -> qty -> count
+        self._best: Dict[str, Any] = {}
+        self._seen: Dict[str, int] = {}  # pkg_id -> day it was counted
+
+    def __len__(self) -> int:
+        return len(self._hist)
+
+    def __contains__(self, pn: str) -> bool:
+        return pn in self._hist
+
+    def _count(self, pn: str, qty: Any, day: int) -> None:
+        hist = self._hist.get(pn)
+        if hist is None:
+            hist = self._hist[pn] = {}
+            self._days[pn] = {}
+        hist[qty] = hist.get(qty, 0) + 1
+        counts = self._days[pn].setdefault(day, {})
+        counts[qty] = counts.get(qty, 0) + 1
+
+    def update(self, pn: str, qtys: Iterable[Any]) -> None:
+        """Count qtys of one PN (no PKG_ID, so neither excluded nor deduplicated)."""
+        day = _today()
+        for qty in qtys:
+            self._count(pn, qty, day)
+        if pn in self._hist:
+            self._best[pn] = _mode(self._hist[pn])
+
+    def add(self, reels: Iterable[Tuple[Optional[str], Optional[str], Any]]) -> int:
+        """Count (pkg_id, pn, qty) reels; returns how many were counted."""
+        day = _today()
+        touched: Set[str] = set()
+        counted = 0
+        for pkg_id, pn, qty in reels:
+            if not pn or (pkg_id or "").startswith(self.exclude_prefixes):
+                continue
+            if self.dedupe and pkg_id:
+                if pkg_id in self._seen:
+                    continue
+                self._seen[pkg_id] = day
+            self._count(pn, qty, day)
+            touched.add(pn)
+            counted += 1
+        for pn in touched:
+            self._best[pn] = _mode(self._hist[pn])
+        return counted
+
+    def add_records(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Count getWO_PKGID records (PKG_ID, HH_PN, QTY)."""
+        return self.add((record.get("PKG_ID"), record.get("HH_PN"), record.get("QTY")) for record in records)
+
+    def prune(self, today: Optional[int] = None) -> int:
+        """Forget what was counted more than retention_days ago; returns how many PNs changed."""
+        if self.retention_days is None:
+            return 0
+        cutoff = (_today() if today is None else today) - self.retention_days
+        self._seen = {pkg_id: day for pkg_id, day in self._seen.items() if day > cutoff}
+        changed = 0
+        for pn, days in list(self._days.items()):
+            expired = [day for day in days if day <= cutoff]
+            if not expired:
+                continue
+            hist = self._hist[pn]
+            for day in expired:
+                for qty, count in days.pop(day).items():
+                    left = hist[qty] - count
+                    if left:
+                        hist[qty] = left
+                    else:
+                        del hist[qty]
+            if hist:
+                self._best[pn] = _mode(hist)
+            else:
+                del self._hist[pn], self._days[pn], self._best[pn]
+            changed += 1
+        return changed
+
+    def std_pkg(self, pn: str) -> Optional[Any]:
+        return self._best.get(pn)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(self._best)
+
+    @classmethod
+    def load(
+        cls,
+        path: str | Path,
+        exclude_prefixes: Sequence[str] = EXCLUDED_PREFIXES,
+        *,
+        retention_days: Optional[int] = DEFAULT_RETENTION_DAYS,
+    ) -> StdPkgEstimator:
+        """The estimator saved at path with its expired days pruned, or an empty one if there is none yet."""
+        estimator = cls(exclude_prefixes, retention_days=retention_days)
+        try:
+            with Path(path).open("rb") as f:
+                state = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return estimator
+        if state.get("version") != STATE_VERSION or tuple(state["exclude_prefixes"]) != estimator.exclude_prefixes:
+            return estimator  # another layout or counted with other exclusions: start over
+        estimator._days = state["days"]
+        estimator._seen = state["seen"]
+        for pn, days in estimator._days.items():
+            hist = estimator._hist[pn] = {}
+            for day in sorted(days):
+                for qty, count in days[day].items():
+                    hist[qty] = hist.get(qty, 0) + count
+        estimator._best = {pn: _mode(hist) for pn, hist in estimator._hist.items()}
+        estimator.prune()
+        return estimator
+
+    def save(self, path: str | Path) -> None:
+        state = {"version": STATE_VERSION, "exclude_prefixes": self.exclude_prefixes, "days": self._days,
+                 "seen": self._seen}
+
+        def write(tmp: Path) -> None:
+            with tmp.open("wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        write_atomic(path, write)
+
+
+class StdPkgRecord(NamedTuple):
+    id: str
+    std_pkg: Any
+    updated: str
+
+
+class StdPkgDiff(NamedTuple):
+    inserts: Dict[str, Any]  # pn -> std_pkg
+    updates: Dict[str, Any]  # record id -> std_pkg
+    unchanged: int
+
+
+def read_std_pkg(base_url: str) -> Dict[str, StdPkgRecord]:
+    """
+    The STD_PKG table as {part_number: record}. Earlier runs could create several records
+    per PN; the most recently updated one is taken as the PN's record.
+    """
+    existing: Dict[str, StdPkgRecord] = {}
+    for row in iter_records(base_url, STD_PKG_COLLECTION, fields=["id", "part_number", "std_pkg", "updated"]):
+        record = StdPkgRecord(row["id"], row.get("std_pkg"), row.get("updated") or "")
+        known = existing.get(row["part_number"])
+        if known is None or record.updated > known.updated:
+            existing[row["part_number"]] = record
+    return existing
+
+
+def diff_std_pkg(existing: Mapping[str, StdPkgRecord], wanted: Mapping[str, Any]) -> StdPkgDiff:
+    inserts: Dict[str, Any] = {}
+    updates: Dict[str, Any] = {}
+    unchanged = 0
+    for pn, std_pkg in wanted.items():
+        if not std_pkg:
+            continue
+        record = existing.get(pn)
+        if record is None:
+            inserts[pn] = std_pkg
+        elif record.std_pkg != std_pkg:
+            updates[record.id] = std_pkg
+        else:
+            unchanged += 1
+    return StdPkgDiff(inserts, updates, unchanged)
+
+
+def upsert_std_pkg(
+    base_url: str,
+    wanted: Mapping[str, Any],
+    *,
+    chunk_size: int = DEFAULT_BATCH_SIZE,
+) -> StdPkgDiff:
+    """
+    Bring STD_PKG in line with {pn: std_pkg}: one read of the table, then only the new
+    and changed PNs are written, chunk_size requests per /api/batch call. PNs without a
+    standard pack are skipped, as before.
+    """
+    diff = diff_std_pkg(read_std_pkg(base_url), wanted)
+    requests: List[Dict[str, Any]] = [
+        {"method": "POST", "url": RECORDS_PATH, "body": {"part_number": pn, "std_pkg": std_pkg}}
+        for pn, std_pkg in diff.inserts.items()
+    ]
+    requests += [
+        {"method": "PATCH", "url": f"{RECORDS_PATH}/{record_id}", "body": {"std_pkg": std_pkg}}
+        for record_id, std_pkg in diff.updates.items()
+    ]
+    if requests:
+        batch(base_url, requests, chunk_size=chunk_size)
+    print(f"STD_PKG: {len(diff.inserts)} new, {len(diff.updates)} updated, {diff.unchanged} unchanged")
+    return diff
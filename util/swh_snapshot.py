@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from util.atomic_write import write_atomic
+from util.file_lock import DEFAULT_TIMEOUT_SECONDS, FileLock
+from util.smw_stock import (
+    COLUMNS,
+    UPSTREAM_URL,
+    SWHInventoryItem,
+    default_body,
+    fetch_swh_export,
+    iter_swh_inventory_batches,
+)
+
+DEFAULT_SNAPSHOT_PATH = Path("cache") / "swh_snapshot.arrow"
+DEFAULT_FULL_REFRESH_SECONDS = 24 * 60 * 60
+DEFAULT_SYNC_SECONDS = 5 * 60
+DEFAULT_OVERLAP_SECONDS = 10 * 60  # re-read the tail of the last window, for clock skew and late writes
+SWH_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+FIELDS = list(COLUMNS.values())
+SCHEMA = pa.schema([(field, pa.int64() if field == "QTY" else pa.string()) for field in FIELDS])
+
+
+class SwhSnapshot:
+    """
+    The SWH stock as columns ({field: values}, one position per reel) plus the time of the
+    last full download and of the last sync. A snapshot loaded from disk stays an Arrow
+    table until something asks for the columns as lists.
+    """
+
+    def __init__(self, columns: Optional[Dict[str, List[Any]]], full_at: float, synced_at: float,
+                 table: Optional[pa.Table] = None):
+        self._columns = columns
+        self._table = table
+        self.full_at = full_at
+        self.synced_at = synced_at
+
+    @classmethod
+    def from_table(cls, table: pa.Table) -> SwhSnapshot:
+        metadata = table.schema.metadata or {}
+        return cls(None, float(metadata[b"full_at"]), float(metadata[b"synced_at"]), table)
+
+    @property
+    def columns(self) -> Dict[str, List[Any]]:
+        if self._columns is None:
+            self._columns = {field: self._table.column(field).to_pylist() for field in FIELDS}
+            self._table = None  # the lists are what gets read and upserted from now on
+        return self._columns
+
+    def to_table(self) -> pa.Table:
+        if self._table is not None:
+            table = self._table
+        else:
+            table = pa.table({field: pa.array(self._columns[field], type=SCHEMA.field(field).type) for field in FIELDS},
+                             schema=SCHEMA)
+        return table.replace_schema_metadata({"full_at": repr(self.full_at), "synced_at": repr(self.synced_at)})
+
+    def __len__(self) -> int:
+        if self._table is not None:
+            return self._table.num_rows
+        return len(self._columns["PKG_ID"])
+
+    def items(self) -> Iterator[SWHInventoryItem]:
+        for values in zip(*(self.columns[field] for field in FIELDS)):
+            yield SWHInventoryItem(**dict(zip(FIELDS, values)))
+
+    def upsert(self, batch: Dict[str, List[Any]]) -> int:
+        """Reconcile a delta batch by PKG_ID: known reels are overwritten, new ones appended."""
+        position = {pkg_id: idx for idx, pkg_id in enumerate(self.columns["PKG_ID"])}
+        added = 0
+        for row in zip(*(batch[field] for field in FIELDS)):
+            idx = position.get(row[0])
+            if idx is None:
+                position[row[0]] = len(self.columns["PKG_ID"])
+                for field, value in zip(FIELDS, row):
+                    self.columns[field].append(value)
+                added += 1
+            else:
+                for field, value in zip(FIELDS, row):
+                    self.columns[field][idx] = value
+        return added
+
+
+def _read_columns(export) -> Dict[str, List[Any]]:
+    columns: Dict[str, List[Any]] = {field: [] for field in FIELDS}
+    for batch in iter_swh_inventory_batches(export):
+        for field in FIELDS:
+            columns[field].extend(batch[field])
+    return columns
+
+
+class SwhSnapshotStore:
+    """
+    Local copy of the SWH stock, kept current with createStartTime/createEndTime deltas
+    instead of downloading the whole warehouse every time.
+
+    The export can only be filtered by creation time, so a delta brings new reels (and
+    re-reads recently created ones); reels issued to the line or moved after they were
+    created are only corrected by the full refresh every full_refresh_seconds.
+    """
+
+    def __init__(
+        self,
+        path: str | Path = DEFAULT_SNAPSHOT_PATH,
+        *,
+        upstream_url: str = UPSTREAM_URL,
+        full_refresh_seconds: float = DEFAULT_FULL_REFRESH_SECONDS,
+        overlap_seconds: float = DEFAULT_OVERLAP_SECONDS,
+        timeout_seconds: int = 120,
+        lock_timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS,
+    ):
+        self.path = Path(path)
+        self.upstream_url = upstream_url
+        self.full_refresh_seconds = full_refresh_seconds
+        self.overlap_seconds = overlap_seconds
+        self.timeout_seconds = timeout_seconds
+        self.lock = FileLock(self.path.with_suffix(".lock"), timeout_seconds=lock_timeout_seconds)
+        self._loaded: Optional[Tuple[int, SwhSnapshot]] = None
+
+    def load(self) -> Optional[SwhSnapshot]:
+        try:
+            mtime_ns = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        # Several readers in one process share the snapshot until another process replaces the file
+        if self._loaded is not None and self._loaded[0] == mtime_ns:
+            return self._loaded[1]
+        try:
+            # Read into memory rather than memory-mapped: a mapped file could not be replaced
+            # by the next save on Windows
+            table = feather.read_table(self.path, memory_map=False)
+            snapshot = SwhSnapshot.from_table(table)
+        except (FileNotFoundError, KeyError, ValueError, pa.ArrowInvalid):
+            return None
+        self._loaded = mtime_ns, snapshot
+        return snapshot
+
+    def save(self, snapshot: SwhSnapshot) -> None:
+        # Uncompressed Arrow IPC (Feather v2): columnar and typed, loads without unpickling every value
+        write_atomic(self.path, lambda tmp: feather.write_feather(snapshot.to_table(), tmp, compression="uncompressed"))
+        self._loaded = self.path.stat().st_mtime_ns, snapshot
+
+    def _download(self, body: Dict[str, Any]) -> Dict[str, List[Any]]:
+        with fetch_swh_export(upstream_url=self.upstream_url, timeout_seconds=self.timeout_seconds, body=body) as export:
+            return _read_columns(export)
+
+    def full_refresh(self) -> SwhSnapshot:
+        started = time.time()
+        snapshot = SwhSnapshot(self._download(default_body()), started, started)
+        self.save(snapshot)
+        return snapshot
+
+    def sync(self, *, full: bool = False) -> SwhSnapshot:
+        """Bring the snapshot up to date: a delta since the last sync, or a full download when due."""
+        with self.lock:
+            return self._sync(full)
+
+    def _sync(self, full: bool) -> SwhSnapshot:
+        snapshot = None if full else self.load()
+        if snapshot is None or time.time() - snapshot.full_at > self.full_refresh_seconds:
+            return self.full_refresh()
+
+        started = time.time()
+        body = default_body()
+        body["createStartTime"] = datetime.fromtimestamp(snapshot.synced_at - self.overlap_seconds).strftime(SWH_TIME_FORMAT)
+        body["createEndTime"] = (datetime.fromtimestamp(started) + timedelta(minutes=1)).strftime(SWH_TIME_FORMAT)
+        # Copy first: stores built from the loaded snapshot keep indexing its columns
+        snapshot = SwhSnapshot({field: list(values) for field, values in snapshot.columns.items()},
+                               snapshot.full_at, started)
+        added = snapshot.upsert(self._download(body))
+        self.save(snapshot)
+        print(f"swh snapshot: {added} new reels, {len(snapshot)} total")
+        return snapshot
+
+    def _fresh(self, snapshot: Optional[SwhSnapshot], max_age_seconds: float, full: bool) -> bool:
+        if snapshot is None:
+            return False
+        return time.time() - (snapshot.full_at if full else snapshot.synced_at) <= max_age_seconds
+
+    def current(self, max_age_seconds: float = DEFAULT_SYNC_SECONDS, *, full: bool = False) -> SwhSnapshot:
+        """
+        The local snapshot, refreshed first if it is older than max_age_seconds (since the last
+        sync, or with full=True since the last full download, which is then what refreshes it).
+        When it is stale, one process refreshes it and the others wait on the lock and reuse it.
+        """
+        snapshot = self.load()
+        if self._fresh(snapshot, max_age_seconds, full):
+            return snapshot
+        with self.lock:
+            snapshot = self.load()  # refreshed by another process while we waited
+            if self._fresh(snapshot, max_age_seconds, full):
+                return snapshot
+            return self._sync(full)
@@ -1,12 +1,16 @@
 from __future__ import annotations
 
+import sys
 from collections import Counter
-from typing import Dict, List
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional
 
-from pydantic import BaseModel
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import pandas as pd
+from pydantic import BaseModel, Field, field_serializer
+
+from util.http_client import DEFAULT_TIMEOUT, get_json, stream_json
+from util.model_ingest import build
+from util.response_cache import ResponseCache, cached_call
 
 SAP_REQUIREMENT = "https://emdii-webtool.foxconn-na.com/api/get_wo_detail?workorder="
 
@@ -35,6 +39,83 @@ class Material(BaseModel):
 
 
 
+DFMS_DATE_FORMAT = "%a, %d %b %Y %H:%M:%S"  # "Thu, 18 Dec 2025 11:55:42 GMT", in UTC
+
+
+def parse_created_datetimes(values: List[Optional[str]]) -> List[Optional[datetime]]:
+    """DFMS CREATED_DATE strings as aware UTC datetimes (None where missing or unparseable), in one pass."""
+    text = pd.Series(values, dtype=object).str.strip().str.removesuffix(" GMT")
+    parsed = pd.to_datetime(text, format=DFMS_DATE_FORMAT, errors="coerce", utc=True)
+    return [None if date is pd.NaT else date.to_pydatetime() for date in parsed]
+
+
+class DeliverItems(BaseModel):
+    """
+    Delivered reels of one part number, stored as parallel columns (one entry per reel).
+    created_date is UTC and serializes to epoch seconds, which it is also parsed back from.
+    append() keeps the raw DFMS strings; they are parsed for the whole column the first
+    time the dates are needed (dates(), filter(), serialization).
+    """
+    created_date: List[Optional[datetime]] = Field(default_factory=list)
+    emp_number: List[str] = Field(default_factory=list)
+    pkg_id: List[str] = Field(default_factory=list)
+    qty: List[int] = Field(default_factory=list)
+    line_name: List[str] = Field(default_factory=list)
+
+    @field_serializer("created_date", when_used="json")
+    def _serialize_created_date(self, value: List[Optional[datetime]]) -> List[Optional[int]]:
+        return [None if date is None else int(date.timestamp()) for date in self.dates()]
+
+    def __len__(self) -> int:
+        return len(self.pkg_id)
+
+    def append(self, created_date: Optional[str], emp_number, pkg_id, qty: int, line_name) -> None:
+        self.created_date.append(created_date)
+        # Reel ids, badges and line names repeat across WOs; intern them so dumps of many WOs share strings
+        self.emp_number.append(sys.intern(str(emp_number)))
+        self.pkg_id.append(sys.intern(str(pkg_id)))
+        self.qty.append(qty)
+        self.line_name.append(sys.intern(str(line_name)))
+
+    def dates(self) -> List[Optional[datetime]]:
+        """created_date with the strings append() stored parsed, in place."""
+        raw = [idx for idx, date in enumerate(self.created_date) if isinstance(date, str)]
+        if raw:
+            for idx, date in zip(raw, parse_created_datetimes([self.created_date[idx] for idx in raw])):
+                self.created_date[idx] = date
+        return self.created_date
+
+    def filter(
+        self,
+        *,
+        line: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> DeliverItems:
+        """Reels delivered to line (if given) with start <= created_date < end (if given)."""
+        keep = [
+            idx for idx, (date, line_name) in enumerate(zip(self.dates(), self.line_name))
+            if (line is None or line_name == line)
+            and (start is None or (date is not None and date >= start))
+            and (end is None or (date is not None and date < end))
+        ]
+        return DeliverItems.model_construct(
+            created_date=[self.created_date[idx] for idx in keep],
+            emp_number=[self.emp_number[idx] for idx in keep],
+            pkg_id=[self.pkg_id[idx] for idx in keep],
+            qty=[self.qty[idx] for idx in keep],
+            line_name=[self.line_name[idx] for idx in keep],
+        )
+
+
+class DeliverMaterialList(BaseModel):
+    pn: str
+    reals: int
+    qty: int
+    std_pkg: int
+    items: DeliverItems = DeliverItems()
+
+
 class MaterialGroup(BaseModel):
     high_level_pn: str
     primary_pn: str
@@ -47,6 +128,13 @@ class MaterialGroup(BaseModel):
     materials: List[Material]
     list_materials_str: List[str] = []
     pending_consumption: int = 0
+    deliver_materials: List[DeliverMaterialList] = []
+    std_pack: int = 0
+    total_deliver_reals: int = 0
+    total_deliver: int = 0
+    overstock: int = 0
+    over_deliver_rate: float = 0
+    severity: float = 0
 
     def to_summary(self):
         return {
@@ -62,7 +150,11 @@ class MaterialGroup(BaseModel):
         }
 
 
-def build_material_groups_from_details(details: List[Dict[str, str]]) -> List[MaterialGroup]:
+def build_material_groups_from_details(
+    details: Iterable[Dict[str, str]],
+    *,
+    trusted: bool = False,
+) -> List[MaterialGroup]:
     if not details:
         return []
 
@@ -105,26 +197,28 @@ def build_material_groups_from_details(details: List[Dict[str, str]]) -> List[Ma
         item["consumption_qty"] = int(item["request_qty"] / total_pcb)
 
     groups: List[MaterialGroup] = []
+    groups_by_pn: Dict[str, List[MaterialGroup]] = {}
     for item in high_level_parts:
-        groups.append(
-            MaterialGroup(
-                high_level_pn=item["high_level_pn"],
-                primary_pn="nan",
-                request_qty=item["request_qty"],
-                attrition=0,
-                total_consumption=0,
-                consumption_qty=int(item["consumption_qty"]),
-                sku=item["sku"],
-                wo=item["wo"],
-                materials=[],
-            )
+        group = build(
+            MaterialGroup,
+            trusted,
+            high_level_pn=item["high_level_pn"],
+            primary_pn="nan",
+            request_qty=item["request_qty"],
+            attrition=0,
+            total_consumption=0,
+            consumption_qty=int(item["consumption_qty"]),
+            sku=item["sku"],
+            wo=item["wo"],
+            materials=[],
         )
+        groups.append(group)
+        groups_by_pn.setdefault(group.high_level_pn, []).append(group)
 
     for item in materials:
-        for group in groups:
-            if group.high_level_pn == item["high_level_pn"]:
-                group.materials.append(Material(**item))
-                group.total_consumption += int(item["request_qty"])
+        for group in groups_by_pn.get(item["high_level_pn"], ()):
+            group.materials.append(build(Material, trusted, **item))
+            group.total_consumption += int(item["request_qty"])
 
     for group in groups:
         group.attrition = group.total_consumption - group.request_qty
@@ -136,38 +230,46 @@ def build_material_groups_from_details(details: List[Dict[str, str]]) -> List[Ma
     return groups
 
 
-def call_api(url: str, *, timeout: int = 10, retries: int = 3, backoff: float = 0.5):
-    session = requests.Session()
-    retry = Retry(
-        total=retries,
-        connect=retries,
-        read=retries,
-        status=retries,
-        backoff_factor=backoff,
-        status_forcelist=(429, 500, 502, 503, 504),
-        allowed_methods=("GET",),
-        raise_on_status=False,
-    )
-    session.mount("http://", HTTPAdapter(max_retries=retry))
-    session.mount("https://", HTTPAdapter(max_retries=retry))
-
-    try:
-        resp = session.get(url, timeout=timeout)
-        resp.raise_for_status()
-        return resp.json()
-    except requests.exceptions.Timeout as e:
-        raise RuntimeError(f"Request timed out after {timeout}s") from e
-    except requests.exceptions.HTTPError as e:
-        raise RuntimeError(f"HTTP error: {e.response.status_code}") from e
-    except requests.exceptions.RequestException as e:
-        raise RuntimeError("Request failed") from e
-    except ValueError as e:
-        raise RuntimeError("Invalid JSON response") from e
+def build_material_groups_by_wo(
+    details_by_wo: Mapping[str, Iterable[Dict[str, str]]],
+    *,
+    trusted: bool = False,
+) -> Dict[str, List[MaterialGroup]]:
+    """Material groups of many WOs in one call: {wo: get_wo_detail rows} -> {wo: groups}."""
+    return {
+        wo: build_material_groups_from_details(details or [], trusted=trusted)
+        for wo, details in details_by_wo.items()
+    }
+
+
+def call_api(url: str, *, timeout: int = DEFAULT_TIMEOUT):
+    return get_json(url, timeout=timeout)
+
+
+def stream_api(url: str, *, timeout: int = DEFAULT_TIMEOUT) -> Iterator[dict]:
+    """Like call_api for endpoints returning a JSON array, but yields the records while the body downloads."""
+    return stream_json(url, timeout=timeout)
+
+
+def get_wo_detail_rows(
+    wo: str,
+    base_url: str = SAP_REQUIREMENT,
+    *,
+    cache: Optional[ResponseCache] = None,
+    closed: bool = False,
+) -> List[Dict[str, str]]:
+    url = f"{base_url}{wo}"
+    return cached_call(cache, url, lambda: call_api(url), closed=closed) or []
 
 
 def get_wo_details(
     wo: str,
     base_url: str = SAP_REQUIREMENT,
+    *,
+    cache: Optional[ResponseCache] = None,
+    closed: bool = False,
+    trusted: bool = False,
 ) -> List[MaterialGroup]:
-    response = call_api(f"{base_url}{wo}")
-    return build_material_groups_from_details(response or [])
+    return build_material_groups_from_details(
+        get_wo_detail_rows(wo, base_url, cache=cache, closed=closed), trusted=trusted
+    )